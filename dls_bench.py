@@ -0,0 +1,246 @@
+from time import perf_counter, time
+import json
+import os
+import subprocess
+import sys
+
+from PIL import Image
+
+import dls_cache
+import dls_manifest
+import dls_metrics
+import dls_player_data
+import dls_store
+import dls_synth
+from dls_triage import FIELDS
+
+BENCH_DIR = 'dls_bench'
+BASELINE_FILE = 'dls_bench_baseline.json'
+# Pixels a located card corner may be off
+LAYOUT_TOLERANCE = 2
+# Screenshots scan_coords is timed on, it takes seconds per screenshot
+SLOW_SAMPLES = 2
+
+
+def import_time(module: str = 'dls_player_data', repeat: int = 3) -> float:
+    '''
+    Output: Fastest import time of the module in a fresh interpreter (s)
+    '''
+    code = f'from time import perf_counter; t = perf_counter(); ' \
+        f'import {module}; print(perf_counter() - t)'
+    return min(float(subprocess.run(
+        [sys.executable, '-c', code], capture_output=True, text=True,
+        check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout)
+        for _ in range(repeat))
+
+
+def count_reader() -> dict:
+    '''
+    Count the OCR calls and the crops sent to them from now on (reader
+    of this process only, so the parse has to run with workers=1)
+    '''
+    counts = {'calls': 0, 'crops': 0}
+    reader = dls_player_data.get_reader()
+    for name in ('readtext', 'readtext_batched', 'recognize'):
+        def counted(*args, method=getattr(reader, name), name=name,
+                    **kwargs):
+            counts['calls'] += 1
+            if name == 'readtext_batched':
+                counts['crops'] += len(args[0])
+            elif name == 'recognize':
+                counts['crops'] += len(kwargs['horizontal_list'])
+            else:
+                counts['crops'] += 1
+
+            return method(*args, **kwargs)
+
+        setattr(reader, name, counted)
+
+    return counts
+
+
+def located(device_dict: dict, truth: dict) -> int:
+    '''
+    Output: Number of cards whose scanned box is within
+    LAYOUT_TOLERANCE of the rendered one
+    '''
+    if not device_dict:
+        return 0
+
+    return sum(all(abs(a - b) <= LAYOUT_TOLERANCE for a, b in zip(x, y))
+               for x, y in zip(dls_player_data.card_boxes(device_dict),
+                               dls_player_data.card_boxes(truth)))
+
+
+def bench_scan(directory: str, truth: dict) -> dict:
+    '''
+    Output: Seconds per screenshot of scan_coords (SLOW_SAMPLES
+    screenshots only), scan_coords_fast and get_layout, fraction of the
+    cards each scan located
+    '''
+    scans = {'scan_coords': dls_player_data.scan_coords,
+             'scan_coords_fast': dls_player_data.scan_coords_fast,
+             'get_layout': dls_player_data.get_layout}
+    times = dict.fromkeys(scans, 0)
+    screenshots = dict.fromkeys(scans, 0)
+    cards = dict.fromkeys(scans, 0)
+    total = dict.fromkeys(scans, 0)
+    for index, (filename, expected) in enumerate(truth.items()):
+        image = Image.open(os.path.join(directory, filename))
+        image.load()
+        for name, scan in scans.items():
+            if name == 'scan_coords' and index >= SLOW_SAMPLES:
+                continue
+
+            t = perf_counter()
+            device_dict = scan(image)
+            times[name] += perf_counter() - t
+            screenshots[name] += 1
+            cards[name] += located(device_dict, expected['layout'])
+            total[name] += len(expected['players'])
+
+    result = {f'{x} s': times[x] / max(screenshots[x], 1) for x in scans}
+    result.update({f'{x} located': cards[x] / max(total[x], 1)
+                   for x in scans})
+    return result
+
+
+def field_values(player: dict) -> list:
+    return [player['name'], player['overall'], player['position'],
+            *player['stats'], player['height'], player['leg'],
+            player['price']]
+
+
+def same(a, b) -> bool:
+    if isinstance(b, str):
+        return ' '.join(str(a).lower().split()) == b.lower()
+
+    return a == b
+
+
+def bench_parse(directory: str, truth: dict, **kwargs) -> dict:
+    '''
+    Parse the directory with parse_image (keyword arguments are passed
+    on, workers=1) and score the players against the ground truth
+    Output: Seconds, cards per second, OCR calls and crops per card,
+    fraction of the cards found, secret cards returned, accuracy of
+    every check_gui field, dls_metrics stage times and counters
+    '''
+    keys = {dls_manifest.file_key(os.path.join(directory, x)): x
+            for x in truth}
+    counts = count_reader()
+    t = perf_counter()
+    players = dls_player_data.parse_image(directory, workers=1,
+                                          manifest=True, **kwargs)
+    seconds = perf_counter() - t
+    cards = sum(len(x['players']) for x in truth.values())
+    expected = sum(not y['secret'] for x in truth.values()
+                   for y in x['players'])
+    correct = dict.fromkeys(FIELDS, 0)
+    found = 0
+    secret = 0
+    for player in players:
+        key, index = player[-1]
+        card = truth[keys[key]]['players'][index]
+        if card['secret'] is True:
+            secret += 1
+            continue
+
+        found += 1
+        values = [player[2], player[3], player[4], *player[5], *player[6:9]]
+        for field, value, right in zip(FIELDS, values, field_values(card)):
+            correct[field] += same(value, right)
+
+    result = {'parse s': seconds, 'cards/s': cards / seconds,
+              'ocr calls/card': counts['calls'] / max(cards, 1),
+              'ocr crops/card': counts['crops'] / max(cards, 1),
+              'found': found / max(expected, 1), 'secret returned': secret}
+    result.update({f'accuracy {x}': y / max(found, 1)
+                   for x, y in correct.items()})
+    result.update({f'stage {x} s': y[0]
+                   for x, y in dls_metrics.TIMES.items()})
+    result.update({f'{x}/card': y / max(cards, 1)
+                   for x, y in dls_metrics.COUNTS.items()})
+    return result
+
+
+def run(directory: str = BENCH_DIR, screenshots: int = 20, seed: int = 0,
+        **kwargs) -> dict:
+    '''
+    Generate the screenshots if the directory has no ground truth, then
+    benchmark them. Working files (manifest, cache, layouts, store) go
+    to the <directory>_work folder, cleared first, so every run starts
+    cold.
+    Output: Flat {metric: value}
+    '''
+    truth_file = os.path.join(directory, dls_synth.TRUTH_FILE)
+    if os.path.exists(truth_file):
+        with open(truth_file, encoding='utf-8') as f:
+            truth = json.load(f)
+    else:
+        truth = dls_synth.generate(directory, screenshots, seed=seed,
+                                   jitter=2)
+
+    directory = os.path.abspath(directory)
+    work = directory + '_work'
+    os.makedirs(work, exist_ok=True)
+    for filename in os.listdir(work):
+        os.remove(os.path.join(work, filename))
+
+    results = {'time': time(), 'import s': import_time(),
+               'screenshots': len(truth)}
+    cwd = os.getcwd()
+    os.chdir(work)
+    try:
+        results.update(bench_scan(directory, truth))
+        dls_player_data.LAYOUTS.clear()
+        results.update(bench_parse(directory, truth, **kwargs))
+    finally:
+        for module in (dls_manifest, dls_cache, dls_store):
+            module.close()
+
+        os.chdir(cwd)
+
+    return results
+
+
+def save_baseline(results: dict, filename: str = BASELINE_FILE):
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=1)
+
+
+def compare(results: dict, filename: str = BASELINE_FILE) -> str:
+    '''
+    Output: Every metric next to its baseline value and the change
+    '''
+    if not os.path.exists(filename):
+        return '\n'.join(f'{x}: {y:.4g}' for x, y in results.items()
+                         if x != 'time')
+
+    with open(filename, encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    lines = []
+    for key, value in results.items():
+        old = baseline.get(key)
+        if key == 'time':
+            continue
+        elif old is None:
+            lines.append(f'{key}: {value:.4g} (new)')
+        elif old == 0:
+            lines.append(f'{key}: {old:.4g} -> {value:.4g}')
+        else:
+            lines.append(f'{key}: {old:.4g} -> {value:.4g} '
+                         f'({(value - old) / abs(old) * 100:+.1f}%)')
+
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    # CPU only, the models have to be downloaded already
+    dls_player_data.configure_reader(gpu=False)
+    # dls_player_data.configure_reader(gpu=False, model_dir='models')
+    results = run(BENCH_DIR, screenshots=20, detect=False)
+    print(compare(results))
+    # Keep as the baseline for the next versions:
+    # save_baseline(results)
@@ -0,0 +1,100 @@
+from time import time
+import hashlib
+import json
+import sqlite3
+
+from PIL import Image
+
+CACHE_FILE = 'dls_ocr_cache.sqlite'
+# Part of every key, bumped when the stored results change format
+VERSION = 2
+MAX_ENTRIES = 200000
+STATS = {'hits': 0, 'misses': 0}
+CONNECTION: sqlite3.Connection = None
+
+
+def crop_key(image: Image.Image, variant: str, allowlist: str,
+             detect: bool) -> str:
+    '''
+    Hash of the crop's pixels and of how it is going to be read
+    '''
+    digest = hashlib.sha1(image.tobytes())
+    digest.update(f'{VERSION}{image.mode}{image.size}{variant}{allowlist}'
+                  f'{detect}'.encode())
+    return digest.hexdigest()
+
+
+def connect(filename: str = CACHE_FILE) -> sqlite3.Connection:
+    global CONNECTION
+    if CONNECTION is None:
+        CONNECTION = sqlite3.connect(filename, timeout=30,
+                                     check_same_thread=False)
+        CONNECTION.execute('CREATE TABLE IF NOT EXISTS ocr '
+                           '(key TEXT PRIMARY KEY, texts TEXT, used REAL)')
+        CONNECTION.execute('CREATE INDEX IF NOT EXISTS ocr_used '
+                           'ON ocr (used)')
+
+    return CONNECTION
+
+
+def close():
+    global CONNECTION
+    if CONNECTION is not None:
+        CONNECTION.close()
+        CONNECTION = None
+
+
+def get_many(keys: list[str]) -> dict[str, list]:
+    '''
+    Input: Crop keys
+    Output: {key: [texts, confidence]} of the cached ones (their LRU
+    time is updated)
+    '''
+    connection = connect()
+    found = {}
+    keys = list(set(keys))
+    for start in range(0, len(keys), 500):
+        chunk = keys[start:start + 500]
+        marks = ','.join('?' * len(chunk))
+        for key, texts in connection.execute(
+                f'SELECT key, texts FROM ocr WHERE key IN ({marks})', chunk):
+            found[key] = json.loads(texts)
+
+    if found:
+        connection.executemany('UPDATE ocr SET used = ? WHERE key = ?',
+                               [(time(), key) for key in found])
+        connection.commit()
+
+    STATS['hits'] += len(found)
+    STATS['misses'] += len(keys) - len(found)
+    return found
+
+
+def put_many(items: dict[str, tuple]):
+    '''
+    Store OCR results and evict the least recently used entries above
+    MAX_ENTRIES
+    '''
+    if not items:
+        return
+
+    connection = connect()
+    now = time()
+    connection.executemany(
+        'INSERT OR REPLACE INTO ocr (key, texts, used) VALUES (?, ?, ?)',
+        [(key, json.dumps(texts, ensure_ascii=False), now)
+         for key, texts in items.items()])
+    count = connection.execute('SELECT COUNT(*) FROM ocr').fetchone()[0]
+    if count > MAX_ENTRIES:
+        connection.execute('DELETE FROM ocr WHERE key IN (SELECT key FROM '
+                           'ocr ORDER BY used LIMIT ?)',
+                           (count - MAX_ENTRIES,))
+
+    connection.commit()
+
+
+def report() -> str:
+    total = STATS['hits'] + STATS['misses']
+    rate = STATS['hits'] / total * 100 if total else 0
+    return f'OCR cache: {STATS["hits"]} hits, {STATS["misses"]} misses ' \
+        f'({rate:.0f}% hit rate)'
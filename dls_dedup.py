@@ -0,0 +1,150 @@
+import os
+
+from PIL import Image
+import numpy
+
+import dls_digits
+
+HASH_FILE = 'dls_card_hashes.npz'
+# Hash grids (columns, rows) of the card and of the name text
+CARD_GRID = (16, 16)
+NAME_GRID = (64, 12)
+# Brightness step counted as an edge by the card dHash
+EDGE = 4
+# Fraction of the set bits that may differ on the same card
+CARD_DISTANCE = 0.15
+NAME_DISTANCE = 0.05
+CARD_BYTES = CARD_GRID[0] * CARD_GRID[1] * 2 // 8
+HASH_BYTES = CARD_BYTES + NAME_GRID[0] * NAME_GRID[1] // 8
+POPCOUNT = numpy.array([bin(x).count('1') for x in range(256)],
+                       dtype=numpy.uint16)
+# Hashes of written cards (persisted) and of the cards seen in this run.
+# The hashes can't see changed digits, so a written card is only skipped
+# while its player (NAMES, in SAVED order) is still marked updated.
+SAVED = numpy.zeros((0, HASH_BYTES), dtype=numpy.uint8)
+NAMES: list[str] = []
+SEEN = SAVED
+SKIPPED = 0
+
+
+def dhash(image: Image.Image, grid: tuple[int] = CARD_GRID) -> numpy.ndarray:
+    '''
+    Input: Image, (columns, rows) of the hash
+    Output: Packed bits of the rising and of the falling edges between
+    horizontal neighbours. Flat areas stay 0, so noise doesn't flip them.
+    '''
+    columns, rows = grid
+    array = numpy.asarray(image.convert('L').resize(
+        (columns + 1, rows), resample=Image.BILINEAR), dtype=numpy.int16)
+    steps = array[:, 1:] - array[:, :-1]
+    return numpy.packbits(numpy.concatenate(((steps > EDGE).ravel(),
+                                             (steps < -EDGE).ravel())))
+
+
+def text_hash(image: Image.Image,
+              grid: tuple[int] = NAME_GRID) -> numpy.ndarray:
+    '''
+    Input: Name strip
+    Output: Packed average hash of the text mask, cropped to the text so
+    a card cropped a few pixels off still gets the same hash
+    '''
+    mask = dls_digits.foreground(image)
+    rows = numpy.flatnonzero(mask.any(axis=1))
+    columns = numpy.flatnonzero(mask.any(axis=0))
+    if len(rows) == 0:
+        return numpy.zeros(grid[0] * grid[1] // 8, dtype=numpy.uint8)
+
+    mask = mask[rows[0]:rows[-1] + 1, columns[0]:columns[-1] + 1]
+    array = numpy.asarray(Image.fromarray(mask.astype(numpy.uint8) * 255)
+                          .resize(grid, resample=Image.BILINEAR))
+    return numpy.packbits(array.ravel() >= 128)
+
+
+def card_hash(card: Image.Image, name: Image.Image) -> numpy.ndarray:
+    return numpy.concatenate((dhash(card), text_hash(name)))
+
+
+def distances(value: numpy.ndarray,
+              hashes: numpy.ndarray) -> tuple[numpy.ndarray]:
+    '''
+    Output: Differing fraction of the set bits of the card and of the
+    name parts
+    '''
+    differ = POPCOUNT[numpy.bitwise_xor(hashes, value)]
+    either = POPCOUNT[numpy.bitwise_or(hashes, value)]
+    parts = []
+    for part in (slice(None, CARD_BYTES), slice(CARD_BYTES, None)):
+        parts.append(differ[:, part].sum(axis=1) /
+                     numpy.maximum(either[:, part].sum(axis=1), 1))
+
+    return tuple(parts)
+
+
+def matches(value: numpy.ndarray, hashes: numpy.ndarray) -> bool:
+    if len(hashes) == 0:
+        return False
+
+    card, name = distances(value, hashes)
+    return bool(((card <= CARD_DISTANCE) & (name <= NAME_DISTANCE)).any())
+
+
+def check(card: Image.Image, name: Image.Image) -> bool:
+    '''
+    Input: Card crop and its name strip
+    Output: True if the card was already seen in this run or written in
+    an earlier one, otherwise it is remembered for this run
+    '''
+    global SEEN, SKIPPED
+    value = card_hash(card, name)
+    if matches(value, SAVED) or matches(value, SEEN):
+        SKIPPED += 1
+        return True
+
+    SEEN = numpy.vstack((SEEN, value))
+    return False
+
+
+def remember(card: Image.Image, name: Image.Image, player_name: str):
+    '''
+    Skip this card in later runs while the player written from it is
+    marked updated (call save_hashes to persist)
+    '''
+    global SAVED
+    value = card_hash(card, name)
+    if not matches(value, SAVED):
+        SAVED = numpy.vstack((SAVED, value))
+        NAMES.append(player_name)
+
+
+def load_hashes(updated=None, filename: str = HASH_FILE):
+    '''
+    Input: updated(player name) -> bool, the update flag of a written
+    player (None keeps every card)
+    Load the written cards of the players still marked updated, so
+    clearing the flags for a game update reads their cards again, and
+    forget the ones seen in the last run
+    '''
+    global SAVED, SEEN, SKIPPED
+    SEEN = numpy.zeros((0, HASH_BYTES), dtype=numpy.uint8)
+    SKIPPED = 0
+    SAVED = SEEN
+    NAMES.clear()
+    if not os.path.exists(filename):
+        return
+
+    with numpy.load(filename) as data:
+        hashes, names = data['hashes'], [str(x) for x in data['names']]
+
+    keep = [i for i, x in enumerate(names)
+            if updated is None or updated(x) is True]
+    SAVED = hashes[keep]
+    NAMES.extend(names[i] for i in keep)
+
+
+def save_hashes(filename: str = HASH_FILE):
+    with open(filename, 'wb') as f:
+        numpy.savez(f, hashes=SAVED, names=numpy.array(NAMES, dtype=str))
+
+
+def report() -> str:
+    return f'Duplicate cards: {SKIPPED} skipped'
@@ -0,0 +1,184 @@
+import os
+
+from PIL import Image
+import numpy
+
+DIGITS_FILE = 'dls_digits.npz'
+GLYPH_SIZE = 16
+THRESHOLD = 0.5
+MAX_DISTANCE = 0.25
+MAX_TEMPLATES = 40
+DIGITS = set('0123456789')
+# {layout key: (glyph features, labels)}
+TEMPLATES: dict[str, tuple[numpy.ndarray, numpy.ndarray]] = {}
+# Layout keys with templates of all ten digits, only these are read
+COMPLETE: set[str] = set()
+
+
+def layout_key(device_dict: dict) -> str:
+    '''
+    Input: Card layout (dls_player_data.card_layout)
+    Output: Its source layout: the card size on the screenshot, before
+    the resampling to CARD_SIZE. Glyphs look the same on the cards of
+    one source layout, not across devices.
+    '''
+    return device_dict.get(
+        'source', f'{device_dict["card_width"]}x{device_dict["card_height"]}')
+
+
+def foreground(image: Image.Image) -> numpy.ndarray:
+    '''
+    Otsu threshold of the channel sum inside the tile border. The
+    smaller class is the text, so both dark-on-light and light-on-dark
+    fields work.
+    '''
+    array = numpy.asarray(image.convert('RGB')).astype(numpy.int16)
+    margin = max(2, min(array.shape[:2]) // 12)
+    values = array[margin:-margin, margin:-margin].sum(axis=2)
+    if values.size == 0:
+        return numpy.zeros((0, 0), dtype=bool)
+
+    hist = numpy.bincount(values.ravel(), minlength=766).astype(float)
+    levels = numpy.arange(len(hist))
+    weight = numpy.cumsum(hist)
+    mean = numpy.cumsum(hist * levels)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        between = (mean[-1] * weight - mean * weight[-1]) ** 2 / \
+            (weight * (weight[-1] - weight))
+    threshold = int(numpy.argmax(numpy.nan_to_num(between)))
+    mask = values > threshold
+    if mask.sum() * 2 > mask.size:
+        mask = ~mask
+
+    return mask
+
+
+def segment(mask: numpy.ndarray, min_pixels: int = 3) -> list[numpy.ndarray]:
+    '''
+    Split a text mask into glyphs at empty columns, left to right
+    '''
+    glyphs = []
+    if mask.size == 0:
+        return glyphs
+
+    columns = numpy.concatenate(([False], mask.any(axis=0), [False]))
+    edges = numpy.flatnonzero(columns[1:] != columns[:-1])
+    for start, end in zip(edges[::2], edges[1::2]):
+        glyph = mask[:, start:end]
+        rows = numpy.flatnonzero(glyph.any(axis=1))
+        glyph = glyph[rows[0]:rows[-1] + 1]
+        if glyph.sum() >= min_pixels:
+            glyphs.append(glyph)
+
+    return glyphs
+
+
+def features(glyph: numpy.ndarray) -> numpy.ndarray:
+    '''
+    Glyph padded to a square (keeps the aspect ratio of narrow digits)
+    and resized to GLYPH_SIZE x GLYPH_SIZE
+    '''
+    height, width = glyph.shape
+    side = max(height, width)
+    square = numpy.zeros((side, side), dtype=numpy.uint8)
+    left = (side - width) // 2
+    top = (side - height) // 2
+    square[top:top + height, left:left + width] = glyph * 255
+    square = Image.fromarray(square).resize((GLYPH_SIZE, GLYPH_SIZE),
+                                            resample=Image.BILINEAR)
+    return numpy.asarray(square, dtype=numpy.float32).ravel() / 255
+
+
+def classify(vector: numpy.ndarray, key: str) -> tuple[str, float]:
+    '''
+    Nearest template of the layout. The confidence compares the best
+    distance with the best distance of any other label, so layouts
+    missing a digit are not read (the glyph could be that digit).
+    '''
+    if key not in COMPLETE:
+        return '', 0.0
+
+    templates, labels = TEMPLATES[key]
+    distances = numpy.abs(templates - vector).mean(axis=1)
+    best = int(numpy.argmin(distances))
+    if distances[best] > MAX_DISTANCE:
+        return labels[best], 0.0
+
+    others = distances[labels != labels[best]]
+    return labels[best], \
+        float(1 - distances[best] / max(others.min(), 1e-6))
+
+
+def read_digits(image: Image.Image, key: str) -> tuple[str, float]:
+    '''
+    Input: Crop of a numeric field, layout key
+    Output: Text and the confidence of its least certain glyph
+    '''
+    glyphs = segment(foreground(image))
+    if glyphs == [] or len(glyphs) > 6:
+        return '', 0.0
+
+    text = ''
+    confidence = 1.0
+    for glyph in glyphs:
+        label, score = classify(features(glyph), key)
+        text += label
+        confidence = min(confidence, score)
+
+    return text, confidence
+
+
+def learn(image: Image.Image, text: str, key: str) -> bool:
+    '''
+    Add the glyphs of a confirmed crop as templates. Crops whose glyph
+    count doesn't match the text are ignored.
+    '''
+    text = str(text).strip()
+    glyphs = segment(foreground(image))
+    if text == '' or len(glyphs) != len(text):
+        return False
+
+    templates, labels = TEMPLATES.get(
+        key, (numpy.zeros((0, GLYPH_SIZE ** 2), dtype=numpy.float32),
+              numpy.zeros(0, dtype='<U1')))
+    for glyph, label in zip(glyphs, text):
+        vector = features(glyph)
+        same = templates[labels == label]
+        if len(same) >= MAX_TEMPLATES or \
+                (len(same) > 0 and
+                 numpy.abs(same - vector).mean(axis=1).min() < 0.02):
+            continue
+
+        templates = numpy.vstack((templates, vector))
+        labels = numpy.append(labels, label)
+
+    TEMPLATES[key] = (templates, labels)
+    if DIGITS <= set(labels.tolist()):
+        COMPLETE.add(key)
+
+    return True
+
+
+def load_templates(filename: str = DIGITS_FILE):
+    TEMPLATES.clear()
+    COMPLETE.clear()
+    if not os.path.exists(filename):
+        return
+
+    with numpy.load(filename) as data:
+        for name in data.files:
+            key, kind = name.rsplit('/', 1)
+            if kind == 'features':
+                TEMPLATES[key] = (data[name], data[f'{key}/labels'])
+                if DIGITS <= set(TEMPLATES[key][1].tolist()):
+                    COMPLETE.add(key)
+
+
+def save_templates(filename: str = DIGITS_FILE):
+    arrays = {}
+    for key, (templates, labels) in TEMPLATES.items():
+        arrays[f'{key}/features'] = templates
+        arrays[f'{key}/labels'] = labels
+
+    with open(filename, 'wb') as f:
+        numpy.savez(f, **arrays)
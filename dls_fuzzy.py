@@ -0,0 +1,148 @@
+import unicodedata
+
+import numpy
+
+# A match is used without review when it is at most MAX_EDITS edits away
+# on a key of MIN_LENGTH characters or more, and its similarity (1 - edit
+# distance / length) is MATCH and beats the runner-up by MARGIN. Closer
+# short names are different players as often as misreads (Pedri, Pedro).
+MAX_EDITS = 1
+MIN_LENGTH = 8
+MATCH = 0.8
+MARGIN = 0.1
+# Below this similarity the name is taken as a new player, above it the
+# name is sent to review
+REVIEW = 0.6
+# Edit distances are computed for the names sharing at most SLACK fewer
+# trigrams than the best one (an edit changes up to 3), CANDIDATES at most
+SLACK = 3
+CANDIDATES = 8
+# Roster names, their compact keys, {key: name id}, {trigram: [name id]}
+# and the numpy copies of the trigram lists used by lookup
+NAMES: list[str] = []
+KEYS: list[str] = []
+EXACT: dict[str, int] = {}
+TRIGRAMS: dict[str, list[int]] = {}
+ARRAYS: dict[str, numpy.ndarray] = {}
+EMPTY = numpy.zeros(0, dtype=numpy.int32)
+
+
+def normalize(name: str) -> str:
+    '''
+    Compact key of a name: NFKC, lowercase, letters and digits only, so
+    "Vini Jr." and "Vinijr。" get the same key
+    '''
+    name = unicodedata.normalize('NFKC', str(name)).lower()
+    return ''.join(x for x in name if x.isalnum())
+
+
+def trigrams(key: str) -> set[str]:
+    key = f'  {key} '
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+
+def clear():
+    NAMES.clear()
+    KEYS.clear()
+    EXACT.clear()
+    TRIGRAMS.clear()
+    ARRAYS.clear()
+
+
+def add(name: str):
+    key = normalize(name)
+    if not key or key in EXACT:
+        return
+
+    EXACT[key] = len(NAMES)
+    for gram in trigrams(key):
+        TRIGRAMS.setdefault(gram, []).append(len(NAMES))
+        ARRAYS.pop(gram, None)
+
+    NAMES.append(name)
+    KEYS.append(key)
+
+
+def build(names):
+    clear()
+    for name in names:
+        add(name)
+
+
+def postings(gram: str) -> numpy.ndarray:
+    if gram not in ARRAYS:
+        ARRAYS[gram] = numpy.array(TRIGRAMS.get(gram, ()),
+                                   dtype=numpy.int32)
+
+    return ARRAYS[gram]
+
+
+def distance(a: str, b: str) -> int:
+    '''
+    Levenshtein distance, bit-parallel (Myers/Hyyrö): one pass over the
+    longer string with the shorter one as bit masks
+    '''
+    if len(a) < len(b):
+        a, b = b, a
+
+    if not b:
+        return len(a)
+
+    masks = {}
+    for i, x in enumerate(b):
+        masks[x] = masks.get(x, 0) | 1 << i
+
+    full = (1 << len(b)) - 1
+    last = 1 << len(b) - 1
+    plus, minus, score = full, 0, len(b)
+    for x in a:
+        equal = masks.get(x, 0)
+        vertical = equal | minus
+        horizontal = (((equal & plus) + plus) ^ plus) | equal
+        plus_h = minus | ~(horizontal | plus) & full
+        minus_h = plus & horizontal
+        if plus_h & last:
+            score += 1
+        elif minus_h & last:
+            score -= 1
+
+        plus_h = (plus_h << 1 | 1) & full
+        minus_h = minus_h << 1 & full
+        plus = minus_h | ~(vertical | plus_h) & full
+        minus = plus_h & vertical
+
+    return score
+
+
+def lookup(name: str) -> tuple[str, bool]:
+    '''
+    Input: OCR'd player name
+    Output: The roster name it matches (the name itself when none is
+    close enough or the match is uncertain), True if it is uncertain
+    '''
+    key = normalize(name)
+    if key in EXACT:
+        return NAMES[EXACT[key]], False
+
+    ids = numpy.concatenate([EMPTY] + [postings(x) for x in trigrams(key)])
+    shared = numpy.bincount(ids, minlength=len(NAMES))
+    candidates = numpy.flatnonzero(shared >= max(shared.max(initial=0) -
+                                                 SLACK, 1))
+    if len(candidates) > CANDIDATES:
+        candidates = candidates[numpy.argpartition(
+            -shared[candidates], CANDIDATES)[:CANDIDATES]]
+
+    edits = {x: distance(key, KEYS[x]) for x in candidates.tolist()}
+    scores = sorted((1 - y / max(len(key), len(KEYS[x])), x)
+                    for x, y in edits.items())
+    if not scores or scores[-1][0] < REVIEW:
+        return name, False
+
+    best, index = scores[-1]
+    runner_up = scores[-2][0] if len(scores) > 1 else 0
+    if best >= MATCH and best - runner_up >= MARGIN and \
+            edits[index] <= MAX_EDITS and len(key) >= MIN_LENGTH:
+        return NAMES[index], False
+
+    return name, True
+
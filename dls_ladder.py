@@ -0,0 +1,135 @@
+import json
+import os
+
+from dls_preprocess import LADDERS
+
+LADDER_FILE = 'dls_ladders.json'
+# Tries after which a variant that never read anything is dropped (only
+# while another variant of the ladder has wins)
+MIN_TRIES = 30
+# Every PROBE-th ladder of a layout keeps its dropped variants, so they
+# come back once they read again
+PROBE = 50
+# Tries at which the counts of a variant are halved, recent runs count
+# more than old ones
+MAX_TRIES = 500
+# {layout key: {ladder: {variant: [tries, wins]}}}, a win is a non-empty
+# OCR result
+STATS: dict[str, dict] = {}
+# Recorded since the last take(), pool workers send them back
+NEW: dict[str, dict] = {}
+# Recorded since load_stats (merged worker stats included) and the stats
+# load_stats read
+RUN: dict[str, dict] = {}
+LOADED: dict[str, dict] = {}
+# {(layout key, ladder): ladder calls}
+CALLS: dict[tuple, int] = {}
+
+
+def variant_stats(stats: dict, key: str, ladder: str, variant: str) -> list:
+    return stats.setdefault(key, {}).setdefault(ladder, {}) \
+        .setdefault(variant, [0, 0])
+
+
+def ladder(key: str, name: str, probe: bool = True) -> tuple[str]:
+    '''
+    Input: Layout key (dls_digits.layout_key), LADDERS name
+    Output: Its variants, the best success rate on this layout first.
+    Variants without a win in MIN_TRIES tries are left out when another
+    one has wins, except on every PROBE-th call (probe=False: never)
+    '''
+    variants = LADDERS[name]
+    stats = STATS.get(key, {}).get(name, {})
+
+    def rate(variant):
+        tries, wins = stats.get(variant, (0, 0))
+        # Untried variants keep their LADDERS place (rate 0.5)
+        return (wins + 1) / (tries + 2)
+
+    ordered = sorted(variants, key=lambda x: -rate(x))
+    if probe is True:
+        CALLS[key, name] = CALLS.get((key, name), 0) + 1
+        if CALLS[key, name] % PROBE == 0:
+            return tuple(ordered)
+
+    if not any(x[1] for x in stats.values()):
+        return tuple(ordered)
+
+    return tuple(x for x in ordered
+                 if stats.get(x, (0, 0))[0] < MIN_TRIES or stats[x][1] > 0)
+
+
+def add(stats: dict, key: str, name: str, variant: str, tries: int,
+        wins: int):
+    entry = variant_stats(stats, key, name, variant)
+    entry[0] += tries
+    entry[1] += wins
+    if stats is STATS and entry[0] >= MAX_TRIES:
+        entry[0] //= 2
+        entry[1] //= 2
+
+
+def record(key: str, name: str, variant: str, win: bool):
+    for stats in (STATS, NEW, RUN):
+        add(stats, key, name, variant, 1, int(win))
+
+
+def take() -> dict:
+    '''
+    Output: The stats recorded since the last call
+    '''
+    new = json.loads(json.dumps(NEW))
+    NEW.clear()
+    return new
+
+
+def merge(new: dict):
+    for key, ladders in new.items():
+        for name, variants in ladders.items():
+            for variant, (tries, wins) in variants.items():
+                for stats in (STATS, RUN):
+                    add(stats, key, name, variant, tries, wins)
+
+
+def load_stats(filename: str = LADDER_FILE):
+    STATS.clear()
+    NEW.clear()
+    RUN.clear()
+    CALLS.clear()
+    LOADED.clear()
+    if os.path.exists(filename):
+        with open(filename, encoding='utf-8') as f:
+            LOADED.update(json.load(f))
+
+    STATS.update(json.loads(json.dumps(LOADED)))
+
+
+def save_stats(filename: str = LADDER_FILE):
+    '''
+    Ladders without a win in this run (a reader problem rather than bad
+    variants) are saved as they were loaded
+    '''
+    stats = json.loads(json.dumps(STATS))
+    for key, ladders in RUN.items():
+        for name, variants in ladders.items():
+            if any(x[1] for x in variants.values()):
+                continue
+
+            loaded = LOADED.get(key, {}).get(name)
+            if loaded is None:
+                del stats[key][name]
+            else:
+                stats[key][name] = loaded
+
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump({x: y for x, y in stats.items() if y}, f, indent=1)
+
+
+def report() -> str:
+    lines = []
+    for key, ladders in STATS.items():
+        for name in ladders:
+            rungs = ladder(key, name, probe=False)
+            lines.append(f'{key} {name}: {" > ".join(rungs)}')
+
+    return '\n'.join(['Ladders:', *lines]) if lines else 'Ladders: default'
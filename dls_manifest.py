@@ -0,0 +1,161 @@
+from threading import Lock
+from time import time
+import hashlib
+import json
+import sqlite3
+
+MANIFEST_FILE = 'dls_manifest.sqlite'
+CONNECTION: sqlite3.Connection = None
+# The OCR thread checkpoints while the review thread records results
+LOCK = Lock()
+
+
+def connect(filename: str = MANIFEST_FILE) -> sqlite3.Connection:
+    global CONNECTION
+    if CONNECTION is None:
+        CONNECTION = sqlite3.connect(filename, timeout=30,
+                                     check_same_thread=False)
+        # File stages: parsed, reviewed or written, the stage of its least
+        # advanced player, or empty when no player was parsed (no layout
+        # found, secret or already known cards), parsed again next run
+        CONNECTION.execute('CREATE TABLE IF NOT EXISTS files '
+                           '(key TEXT PRIMARY KEY, filename TEXT, '
+                           'stage TEXT, time REAL)')
+        # Player stages: parsed, reviewed (data is the submitted row),
+        # skipped or written
+        CONNECTION.execute('CREATE TABLE IF NOT EXISTS players '
+                           '(key TEXT, card INTEGER, box TEXT, layout TEXT, '
+                           'player TEXT, stage TEXT, data TEXT, '
+                           'PRIMARY KEY (key, card))')
+
+    return CONNECTION
+
+
+def close():
+    global CONNECTION
+    if CONNECTION is not None:
+        CONNECTION.close()
+        CONNECTION = None
+
+
+def file_key(filename: str) -> str:
+    '''
+    Hash of the file content, so renamed or moved screenshots are still
+    recognized
+    '''
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def file_stage(key: str) -> str:
+    '''
+    Output: Stage of the file, None if it was never parsed
+    '''
+    with LOCK:
+        row = connect().execute('SELECT stage FROM files WHERE key = ?',
+                                (key,)).fetchone()
+
+    return row[0] if row else None
+
+
+def checkpoint(key: str, filename: str, players: list[tuple]):
+    '''
+    Input: File key, (card index, card box, layout, player values) of its
+    parsed players
+    Store them and mark the file parsed (empty without players) in one
+    transaction
+    '''
+    with LOCK:
+        connection = connect()
+        with connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO players VALUES '
+                '(?, ?, ?, ?, ?, \'parsed\', NULL)',
+                [(key, card, json.dumps(box), json.dumps(layout),
+                  json.dumps(values, ensure_ascii=False))
+                 for card, box, layout, values in players])
+            connection.execute(
+                'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)',
+                (key, filename, 'parsed' if players else 'empty', time()))
+
+
+def parsed_players(key: str) -> list[tuple]:
+    '''
+    Output: (card index, card box, layout, player values) of the players
+    of the file that weren't reviewed yet
+    '''
+    with LOCK:
+        rows = connect().execute(
+            'SELECT card, box, layout, player FROM players '
+            'WHERE key = ? AND stage = \'parsed\' ORDER BY card',
+            (key,)).fetchall()
+
+    players = []
+    for card, box, layout, values in rows:
+        layout = {k: tuple(v) if isinstance(v, list) else v
+                  for k, v in json.loads(layout).items()}
+        values = json.loads(values)
+        values[0] = tuple(values[0])
+        players.append((card, tuple(json.loads(box)), layout, tuple(values)))
+
+    return players
+
+
+def update_files(connection: sqlite3.Connection, keys: set[str]):
+    '''
+    Move files to the stage of their least advanced player
+    '''
+    for key in keys:
+        stages = {x[0] for x in connection.execute(
+            'SELECT DISTINCT stage FROM players WHERE key = ?', (key,))}
+        if 'parsed' in stages:
+            continue
+
+        stage = 'reviewed' if 'reviewed' in stages else 'written'
+        connection.execute('UPDATE files SET stage = ?, time = ? '
+                           'WHERE key = ?', (stage, time(), key))
+
+
+def review(source: tuple[str, int], data: list = None):
+    '''
+    Input: (file key, card index) of a reviewed player, the submitted
+    row (None if it was skipped)
+    '''
+    with LOCK:
+        connection = connect()
+        with connection:
+            connection.execute(
+                'UPDATE players SET stage = ?, data = ? '
+                'WHERE key = ? AND card = ?',
+                ('skipped' if data is None else 'reviewed',
+                 None if data is None else json.dumps(data,
+                                                      ensure_ascii=False),
+                 *source))
+            update_files(connection, {source[0]})
+
+
+def reviewed_players() -> list[tuple]:
+    '''
+    Output: (source, submitted row) of the players reviewed but not
+    written, e.g. because the last run stopped before writing
+    '''
+    with LOCK:
+        rows = connect().execute(
+            'SELECT key, card, data FROM players WHERE stage = \'reviewed\' '
+            'ORDER BY rowid').fetchall()
+
+    return [((key, card), json.loads(data)) for key, card, data in rows]
+
+
+def written(sources: list[tuple[str, int]]):
+    with LOCK:
+        connection = connect()
+        with connection:
+            connection.executemany(
+                'UPDATE players SET stage = \'written\' '
+                'WHERE key = ? AND card = ?', sources)
+            update_files(connection, {x[0] for x in sources})
@@ -0,0 +1,128 @@
+from contextlib import contextmanager
+from time import perf_counter, time
+import cProfile
+import json
+import os
+
+METRICS_FILE = 'dls_metrics.json'
+PROMETHEUS_FILE = 'dls_metrics.prom'
+PROFILE_FILE = 'dls_profile.pstats'
+# {stage: [seconds, calls]} and {counter: value} of this run
+TIMES: dict[str, list] = {}
+COUNTS: dict[str, int] = {}
+# Export at the end of generate_players and check_gui
+ENABLED = True
+PROFILER: cProfile.Profile = None
+
+
+@contextmanager
+def timer(stage: str):
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        entry = TIMES.setdefault(stage, [0.0, 0])
+        entry[0] += perf_counter() - start
+        entry[1] += 1
+
+
+def count(counter: str, value: int = 1):
+    COUNTS[counter] = COUNTS.get(counter, 0) + value
+
+
+def reset():
+    TIMES.clear()
+    COUNTS.clear()
+
+
+def snapshot() -> dict:
+    '''
+    Output: Copy of the metrics, for pool workers to send back (merge)
+    '''
+    return {'times': {x: list(y) for x, y in TIMES.items()},
+            'counts': dict(COUNTS)}
+
+
+def merge(metrics: dict):
+    for stage, (seconds, calls) in metrics['times'].items():
+        entry = TIMES.setdefault(stage, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += calls
+
+    for counter, value in metrics['counts'].items():
+        count(counter, value)
+
+
+def start_profile():
+    global PROFILER
+    PROFILER = cProfile.Profile()
+    PROFILER.enable()
+
+
+def stop_profile(filename: str = PROFILE_FILE):
+    '''
+    Save the cProfile stats (pstats format), no-op when not profiling
+    '''
+    global PROFILER
+    if PROFILER is not None:
+        PROFILER.disable()
+        PROFILER.dump_stats(filename)
+        PROFILER = None
+
+
+def summary() -> dict:
+    return {'time': time(),
+            'stages': {x: {'seconds': y[0], 'calls': y[1]}
+                       for x, y in TIMES.items()},
+            'counters': dict(COUNTS)}
+
+
+def prometheus() -> str:
+    '''
+    Output: The metrics in the Prometheus text format. Every run starts
+    from zero (reset), so they are gauges of the last run, not counters.
+    '''
+    lines = ['# HELP dls_last_run_timestamp_seconds End of the last run',
+             '# TYPE dls_last_run_timestamp_seconds gauge',
+             f'dls_last_run_timestamp_seconds {time():.3f}']
+    lines += ['# HELP dls_last_run_stage_seconds Time spent in each stage',
+              '# TYPE dls_last_run_stage_seconds gauge']
+    lines += [f'dls_last_run_stage_seconds{{stage="{x}"}} {y[0]:.6f}'
+              for x, y in TIMES.items()]
+    lines += ['# HELP dls_last_run_stage_calls Times each stage ran',
+              '# TYPE dls_last_run_stage_calls gauge']
+    lines += [f'dls_last_run_stage_calls{{stage="{x}"}} {y[1]}'
+              for x, y in TIMES.items()]
+    lines += ['# HELP dls_last_run_events Cards, OCR crops, fallback rungs',
+              '# TYPE dls_last_run_events gauge']
+    lines += [f'dls_last_run_events{{event="{x}"}} {y}'
+              for x, y in COUNTS.items()]
+    return '\n'.join(lines) + '\n'
+
+
+def write_file(filename: str, text: str):
+    # Replaced at once, a collector may read it at any time
+    temp = f'{filename}.{os.getpid()}'
+    with open(temp, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+    os.replace(temp, filename)
+
+
+def export(json_file: str = METRICS_FILE,
+           prometheus_file: str = PROMETHEUS_FILE):
+    '''
+    Write the JSON summary and the Prometheus text file (None skips one)
+    '''
+    if json_file is not None:
+        write_file(json_file, json.dumps(summary(), indent=1))
+
+    if prometheus_file is not None:
+        write_file(prometheus_file, prometheus())
+
+
+def report() -> str:
+    total = sum(x[0] for x in TIMES.values())
+    lines = [f'{x}: {y[0]:.2f}s ({y[0] / total * 100:.0f}%), {y[1]} calls'
+             for x, y in sorted(TIMES.items(), key=lambda x: -x[1][0])]
+    return '\n'.join(['Stages:', *lines]) if lines else 'Stages: none'
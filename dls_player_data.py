@@ -1,16 +1,39 @@
-from string import ascii_uppercase, ascii_letters
+from bisect import bisect_left
+from contextlib import closing
+from functools import lru_cache
+from queue import Empty, Full, Queue
+from string import ascii_letters
+from threading import Event, Thread
 from time import perf_counter
-from tkinter import Tk, StringVar, Label, Entry, Button
+from tkinter import END, Tk, Label, Entry, Button
+import json
 import os
 
-from openpyxl import load_workbook
-from openpyxl.styles import Alignment, Font, PatternFill
 from PIL import Image, ImageTk
-from tqdm import tqdm
-import easyocr
 import numpy
 
-READER = easyocr.Reader(['en', 'ch_sim'])
+import dls_cache
+import dls_dedup
+import dls_digits
+import dls_fuzzy
+import dls_ladder
+import dls_manifest
+import dls_metrics
+import dls_store
+import dls_triage
+from dls_preprocess import LADDERS, preprocess
+from dls_store import player_key
+
+READER = None
+READER_CONFIG = {
+    'languages': ['en', 'ch_sim'],
+    'detector': True,
+    'model_dir': None,
+    'threads': None,
+    'gpu': True
+}
+# cards_count is the grid check_layout probes, get_layout then counts the
+# cards actually on the screenshot (grid_size)
 DEVICE = {
     '1536x2048': {
         'device': ('IPAD'),
@@ -30,7 +53,8 @@ DEVICE = {
         'height': (10, 234, 42, 256),
         'leg': (83, 234, 105, 256),
         'price': (300, 222, 420, 260),
-        'position': (330, 172, 352, 190)
+        'position': (330, 172, 352, 190),
+        'panel': (0, 222, 423, 260)
     },
     '828x1792': {
         'device': ('iPhone XR'),
@@ -49,35 +73,72 @@ DEVICE = {
         'height': (8, 143, 26, 155),
         'leg': (52, 143, 86, 157),
         'price': (159, 134, 229, 158),
-        'position': (200, 106, 215, 115)
+        'position': (200, 106, 215, 115),
+        'panel': (0, 134, 257, 159)
     }
 }
+# Every card is resampled to this size before any field is cropped, so
+# the crops, upscale factors and OCR inputs are the same on all devices
+# (None keeps the native size)
+CARD_SIZE = (320, 197)
+# Card-relative DEVICE entries scaled with the card
+CARD_BOXES = ('name', 'overall', 'position', 'panel', 'height', 'leg',
+              'price')
+PANEL_FIELDS = {
+    'height': (0.02, 0.11),
+    'leg': (0.19, 0.34),
+    'price': (0.6, 1.0)
+}
+DIGITS = '0123456789'
+LAYOUT_FILE = 'dls_layouts.json'
+MAX_PENDING = 2
+QUEUE_SIZE = 16
+# check_gui: players converted ahead, fields per player, poll interval (ms)
+PREFETCH = 4
+REVIEW_FIELDS = 14
+REVIEW_POLL = 50
+# Decoded screenshots kept for cropping the review images again
+SCREENSHOTS = 4
+LAYOUTS: dict[str, list[dict]] = {}
+SHEETS = dls_store.SHEETS
+# Workbook of the players, None keeps them in dls_store instead
+wb = None
+# {normalized player name: [[sheet, row, updated], ...]}, see check_has_player
+PLAYER_INDEX: dict[str, list[list]] = {}
+INDEXED_BOOK = None
+# Roster in the dls_fuzzy index: wb or dls_store
+FUZZY_ROSTER = None
+
+
+OVERALL_COLORS = (
+    ((38, 41), (220, 222), (20, 30)),
+    ((240, 243), (197, 200), (76, 78)),
+    ((240, 255), (135, 140), (20, 26))
+)
+POSITION_COLORS = (
+    ((255, 255), (85, 90), (115, 125)),
+    ((45, 55), (165, 175), (250, 255)),
+    ((250, 255), (250, 255), (85, 95)),
+    ((65, 75), (245, 255), (90, 100))
+)
+
+
+def check_color(pixel: tuple[int], colors: tuple) -> bool:
+    return any(all(low <= value <= high
+                   for value, (low, high) in zip(pixel, color))
+               for color in colors)
 
 
 def check_overall(pixel: tuple[int]):
-    check1 = 38 <= pixel[0] <= 41 and 220 <= pixel[1] <= 222 and \
-        20 <= pixel[2] <= 30
-    check2 = 240 <= pixel[0] <= 243 and 197 <= pixel[1] <= 200 and \
-        76 <= pixel[2] <= 78
-    check3 = 240 <= pixel[0] <= 255 and 135 <= pixel[1] <= 140 and \
-        20 <= pixel[2] <= 26
-    return check1 or check2 or check3
+    return check_color(pixel, OVERALL_COLORS)
 
 
 def check_position(pixel: tuple[int]):
-    check1 = pixel[0] == 255 and 85 <= pixel[1] <= 90 and \
-        115 <= pixel[2] <= 125
-    check2 = 45 <= pixel[0] <= 55 and 165 <= pixel[1] <= 175 and \
-        250 <= pixel[2] <= 255
-    check3 = 250 <= pixel[0] <= 255 and 250 <= pixel[1] <= 255 and \
-        85 <= pixel[2] <= 95
-    check4 = 65 <= pixel[0] <= 75 and 245 <= pixel[1] <= 255 and \
-        90 <= pixel[2] <= 100
-    return check1 or check2 or check3 or check4
+    return check_color(pixel, POSITION_COLORS)
 
 
 def scan_coords(image: Image.Image) -> dict:
-    device_dict = {'cards_count': (3, 3)}
+    device_dict = {}
     width, height = image.size
     for x in range(width):
         pixels = []
@@ -157,6 +218,7 @@ def scan_coords(image: Image.Image) -> dict:
                         device_dict['height_space'] = y3 - y2
                         break
 
+    device_dict['cards_count'] = grid_size(image, device_dict)
     x0 = device_dict['topleft_coords'][0]
     y0 = device_dict['topleft_coords'][1]
     y0 += device_dict['card_height'] + device_dict['height_space']
@@ -256,197 +318,845 @@ def scan_coords(image: Image.Image) -> dict:
     return device_dict
 
 
-def parse_image(image_dir: str,
-                max_file: int = -1, max_cards: int = -1,
-                output: bool = False, rename: bool = True,
-                restore: bool = False):
+def color_mask(array: numpy.ndarray, colors: tuple) -> numpy.ndarray:
     '''
-    Input: Transfer market screenshot directory
-    Output: Players and stats
+    Vectorized check_color: True where a pixel matches any of the colors
     '''
-    if restore is True:
-        for image_file in os.listdir(image_dir):
-            filename = image_dir + os.sep + image_file
-            fn2 = filename.replace('_OLD', '')
-            os.rename(filename, fn2)
+    mask = numpy.zeros(array.shape[:2], dtype=bool)
+    for color in colors:
+        match = numpy.ones(array.shape[:2], dtype=bool)
+        for channel, (low, high) in enumerate(color):
+            match &= (array[..., channel] >= low) & \
+                (array[..., channel] <= high)
+        mask |= match
 
-    cards: list[Image.Image] = []
-    i = 0
-    for image_file in os.listdir(image_dir):
-        filename = image_dir + os.sep + image_file
-        if '.' not in filename or image_file[0] == '.':
-            continue
+    return mask
 
-        if filename.split('.')[-2].endswith('_OLD'):
-            continue
 
-        if i == max_file:
+def channel_bounds(array: numpy.ndarray) -> tuple[numpy.ndarray]:
+    '''
+    Per-pixel minimum and maximum of the RGB channels
+    '''
+    red, green, blue = array[..., 0], array[..., 1], array[..., 2]
+    return (numpy.minimum(numpy.minimum(red, green), blue),
+            numpy.maximum(numpy.maximum(red, green), blue))
+
+
+def range_mask(bounds: tuple[numpy.ndarray], low: int,
+               high: int) -> numpy.ndarray:
+    '''
+    True where every channel is within [low, high]
+    '''
+    return (bounds[0] >= low) & (bounds[1] <= high)
+
+
+def run_lengths(mask: numpy.ndarray) -> numpy.ndarray:
+    '''
+    Length of the run of True values ending at each element (along rows)
+    '''
+    index = numpy.arange(mask.shape[-1], dtype=numpy.int32)
+    last_false = numpy.maximum.accumulate(
+        numpy.where(mask, -1, index), axis=-1)
+    return index - last_false
+
+
+def first_index(mask: numpy.ndarray, start: int = 0):
+    '''
+    Index of the first True value at or after start, or None
+    '''
+    if start >= len(mask) or not mask[start:].any():
+        return None
+
+    return start + int(numpy.argmax(mask[start:]))
+
+
+def scan_line(overall: numpy.ndarray, position: numpy.ndarray,
+              last: bool, find_overall: bool, find_start: bool,
+              find_end: bool):
+    '''
+    One row (or column) of the overall/position search in scan_coords.
+    Returns (overall, position start, position end, last).
+    '''
+    stop = len(overall)
+    start = end = None
+    overall_index = first_index(overall) if find_overall else None
+    if overall_index is not None:
+        stop = overall_index
+
+    if find_start:
+        start = first_index(position[:stop])
+
+    if find_end or start is not None:
+        previous = numpy.concatenate(([last], position[:-1]))
+        end = first_index((previous & ~position)[:stop])
+
+    if end is not None:
+        overall_index = None
+        stop = end
+
+    if stop == len(overall):
+        last = bool(position[-1])
+    elif stop > 0:
+        last = bool(position[stop - 1])
+
+    return overall_index, start, end, last
+
+
+def scan_coords_fast(image: Image.Image) -> dict:
+    '''
+    Same as scan_coords, but converts the image to an array once and
+    finds the boundaries with masks instead of per-pixel getpixel calls
+    '''
+    device_dict = {}
+    array = numpy.asarray(image.convert('RGB'))
+    height, width = array.shape[:2]
+
+    bounds = channel_bounds(array)
+    gray = range_mask(bounds, 133, 133)
+    dark = range_mask(bounds, 98, 98)
+    edge = dark[3:] & gray[2:-1] & gray[1:-2] & gray[:-3]
+    have = gray.any(axis=0)
+    have2 = (run_lengths(gray.T) >= 20).any(axis=1)
+    x_left = first_index(edge.any(axis=0))
+    if x_left is None:
+        return {}
+
+    x_gap = first_index(~have, x_left)
+    if x_gap is None:
+        return {}
+
+    x_next = first_index(have2, x_gap)
+    if x_next is None:
+        return {}
+
+    device_dict['topleft_coords'] = [x_left]
+    device_dict['card_width'] = x_gap - 1 - x_left
+    device_dict['width_space'] = x_next - x_gap
+
+    gray_hits = run_lengths(range_mask(bounds, 132, 134)) == 200
+    panel = range_mask(bounds, 53, 57)
+    panel_hits = run_lengths(panel) == 100
+    name = range_mask(bounds, 72, 98)
+    border = range_mask(bounds, 18, 30)
+    next_card = range_mask(bounds, 123, 135)
+    topleft = device_dict['topleft_coords']
+    for y in numpy.flatnonzero(gray_hits.any(axis=1) |
+                               panel_hits.any(axis=1)):
+        y = int(y)
+        if len(topleft) == 2 and 'height_space' in device_dict:
             break
 
-        i += 1
+        x_gray = None
+        if len(topleft) == 1:
+            x_gray = first_index(gray_hits[y])
 
-        try:
-            image = Image.open(filename)
-            if rename is not False:
-                fn = filename.split('.')
-                os.rename(filename, fn[-2] + '_OLD.' + fn[-1])
-        except Exception:
-            continue
+        stop = width if x_gray is None else x_gray
+        for x in numpy.flatnonzero(panel_hits[y, :stop]):
+            if 'height_space' in device_dict:
+                break
 
-        device_dict = scan_coords(image)
-        x0 = device_dict['topleft_coords'][0]
-        count_x = 0
-        while count_x < device_dict['cards_count'][0]:
-            y0 = device_dict['topleft_coords'][1]
-            x1 = x0 + device_dict['card_width']
-            count_y = 0
-            while count_y < device_dict['cards_count'][1]:
-                y1 = y0 + device_dict['card_height']
-                card = image.crop((x0, y0, x1, y1))
-                cards.append(card)
-                count_y += 1
-                y0 = y1 + device_dict['height_space']
-
-            count_x += 1
-            x0 = x1 + device_dict['width_space']
-
-    if max_cards != -1:
-        cards = cards[:max_cards]
+            y2 = y + 80
+            if 'card_height' not in device_dict and len(topleft) == 2:
+                index = first_index(border[y + 11:y + 81, x])
+                if index is not None:
+                    y2 = y + 11 + index
+                    device_dict['card_height'] = y2 - topleft[1]
+
+            if 'panel' not in device_dict and len(topleft) == 2:
+                index = first_index(panel[y + 11:y2 + 1, x])
+                if index is not None:
+                    device_dict['panel'] = y + 11 + index - 1 - topleft[1]
+
+            if 'card_height' in device_dict:
+                index = first_index(next_card[y2 + 21:y2 + 200, x])
+                if index is not None:
+                    device_dict['height_space'] = 21 + index
+
+        if x_gray is not None:
+            topleft.append(y)
+            index = first_index(name[y + 1:y + 101, x_gray])
+            if index is not None:
+                device_dict['name'] = \
+                    (0, 0, device_dict['card_width'], index + 1)
+
+    # A market screen cut short, or another screen with a gray bar
+    if len(topleft) != 2 or any(x not in device_dict for x in (
+            'name', 'panel', 'card_height', 'height_space')):
+        return {}
 
-    if output is not True:
-        pbar = tqdm(cards)
-    else:
-        pbar = cards
-
-    result: list[str] = []
-    for card in pbar:
-        t1 = perf_counter()
-        name_image_ori = card.crop(device_dict['name'])
-        name_image = name_image_ori.resize(
-            (name_image_ori.size[0] * 2, name_image_ori.size[1] * 2),
-            resample=Image.BILINEAR)
-        player_name: list[str] = READER.readtext(numpy.asarray(name_image),
-                                                 detail=False)
+    device_dict['cards_count'] = grid_size(image, device_dict)
+    x0 = device_dict['topleft_coords'][0]
+    y0 = device_dict['topleft_coords'][1]
+    y0 += device_dict['card_height'] + device_dict['height_space']
+    x1 = x0 + device_dict['card_width']
+    y1 = y0 + device_dict['card_height']
+    image = image.crop((x0, y0, x1, y1))
+    array = numpy.asarray(image.convert('RGB'))
+    height, width = array.shape[:2]
+
+    black = channel_bounds(array[4:height - 4, 2:width - 2])[1] == 0
+    columns = black.any(axis=0)
+    x_start = first_index(columns)
+    if x_start is not None:
+        device_dict['stats_topleft_coords'] = [x_start + 2]
+        x_end = first_index(~columns, x_start)
+        if x_end is not None:
+            device_dict['stats_size'] = x_end - 1 - x_start
+            x_next = first_index(columns, x_end)
+            if x_next is not None:
+                device_dict['stats_width_space'] = x_next - x_end
+
+    rows = black.any(axis=1)
+    y_start = first_index(rows)
+    if y_start is not None:
+        device_dict['stats_topleft_coords'].append(y_start + 4)
+        y_end = first_index(~rows, y_start)
+        if y_end is not None:
+            y_next = first_index(rows, y_end)
+            if y_next is not None:
+                device_dict['stats_height_space'] = y_next - y_end
+
+    if any(x not in device_dict for x in (
+            'stats_size', 'stats_width_space', 'stats_height_space')) or \
+            len(device_dict['stats_topleft_coords']) != 2:
+        return {}
+
+    overall = color_mask(array, OVERALL_COLORS)
+    position = color_mask(array, POSITION_COLORS)
+    size = int(device_dict['stats_size'] * 0.7) + 1
+    last = False
+    for y in range(height):
+        if 'overall' in device_dict and 'position' in device_dict:
+            break
+
+        found = 'position' in device_dict and \
+            device_dict['position'][2] == 0
+        x_overall, x_start, x_end, last = scan_line(
+            overall[y], position[y], last,
+            'overall' not in device_dict,
+            'position' not in device_dict, found)
+        if x_start is not None:
+            device_dict['position'] = [x_start, y, 0, 0]
+
+        if x_end is not None:
+            device_dict['position'][2] = x_end
+
+        if x_overall is not None:
+            device_dict['overall'] = [0, y, 0, y + size]
+
+    if 'overall' not in device_dict or 'position' not in device_dict:
+        return {}
+
+    last = False
+    for x in range(width):
+        if device_dict['overall'][0] != 0 and \
+                device_dict['position'][3] != 0:
+            break
+
+        y_overall, _, y_end, last = scan_line(
+            overall[:, x], position[:, x], last,
+            device_dict['overall'][0] == 0, False,
+            device_dict['position'][3] == 0)
+        if y_end is not None:
+            device_dict['position'][3] = y_end
+
+        if y_overall is not None:
+            device_dict['overall'][0] = x
+            device_dict['overall'][2] = x + size
+
+    device_dict['panel'] = (0, device_dict['panel'],
+                            image.width, image.height)
+    return device_dict
+
+
+def card_boxes(device_dict: dict) -> list[tuple[int]]:
+    '''
+    Input: Layout
+    Output: Card boxes, column by column
+    '''
+    boxes = []
+    x0 = device_dict['topleft_coords'][0]
+    count_x = 0
+    while count_x < device_dict['cards_count'][0]:
+        y0 = device_dict['topleft_coords'][1]
+        x1 = x0 + device_dict['card_width']
+        count_y = 0
+        while count_y < device_dict['cards_count'][1]:
+            y1 = y0 + device_dict['card_height']
+            boxes.append((x0, y0, x1, y1))
+            count_y += 1
+            y0 = y1 + device_dict['height_space']
+
+        count_x += 1
+        x0 = x1 + device_dict['width_space']
+
+    return boxes
+
+
+def name_bar(image: Image.Image, device_dict: dict, x0: int,
+             y0: int) -> bool:
+    '''
+    True if the card at (x0, y0) is on the screenshot and has the gray
+    name bar. Probed at its right end: names are left aligned and a
+    scanned layout may be a pixel short per column.
+    '''
+    x1 = x0 + device_dict['card_width']
+    name_y = y0 + device_dict.get('name', (0, 0, 0, 4))[3] - 2
+    if x1 >= image.width or y0 + device_dict['card_height'] >= image.height:
+        return False
+
+    return all(123 <= x <= 135 for x in image.getpixel((x1 - 4, name_y))[:3])
+
+
+def grid_size(image: Image.Image, device_dict: dict) -> tuple[int, int]:
+    '''
+    Output: (columns, rows) of cards, counted along the first row and
+    the first column of the grid
+    '''
+    x0, y0 = device_dict['topleft_coords'][:2]
+    step_x = device_dict['card_width'] + device_dict['width_space']
+    step_y = device_dict['card_height'] + device_dict['height_space']
+    columns = 0
+    while name_bar(image, device_dict, x0 + columns * step_x, y0):
+        columns += 1
+
+    rows = 0
+    while name_bar(image, device_dict, x0, y0 + rows * step_y):
+        rows += 1
+
+    return max(columns, 1), max(rows, 1)
+
+
+def card_layout(device_dict: dict) -> dict:
+    '''
+    Input: Screenshot layout
+    Output: The layout of its cards resampled to CARD_SIZE (card-relative
+    boxes, stat tiles and card size scaled, the screenshot card size
+    kept as the dls_digits.layout_key)
+    '''
+    if CARD_SIZE is None or device_dict.get('canonical') is True:
+        return device_dict
+
+    sx = CARD_SIZE[0] / device_dict['card_width']
+    sy = CARD_SIZE[1] / device_dict['card_height']
+    layout = dict(device_dict, card_width=CARD_SIZE[0],
+                  card_height=CARD_SIZE[1], canonical=True,
+                  source=dls_digits.layout_key(device_dict))
+    for key in CARD_BOXES:
+        if key in device_dict:
+            x0, y0, x1, y1 = device_dict[key]
+            layout[key] = (round(x0 * sx), round(y0 * sy), round(x1 * sx),
+                           round(y1 * sy))
+
+    x, y = device_dict['stats_topleft_coords']
+    layout['stats_topleft_coords'] = (round(x * sx), round(y * sy))
+    layout['stats_size'] = round(device_dict['stats_size'] * sx)
+    layout['stats_width_space'] = \
+        round(device_dict['stats_width_space'] * sx)
+    layout['stats_height_space'] = \
+        round(device_dict['stats_height_space'] * sy)
+    return layout
+
+
+def crop_card(image: Image.Image, box: tuple[int]) -> Image.Image:
+    '''
+    Card crop resampled once to CARD_SIZE
+    '''
+    card = image.crop(box)
+    if CARD_SIZE is None or card.size == CARD_SIZE:
+        return card
+
+    return card.resize(CARD_SIZE, resample=Image.LANCZOS)
+
+
+def check_layout(image: Image.Image, device_dict: dict) -> bool:
+    '''
+    Cheap layout fingerprint: probe the name bar of every card and the
+    dark border under it instead of scanning the whole screenshot
+    '''
+    probes = []
+    for x0, y0, x1, y1 in card_boxes(device_dict):
+        if x1 >= image.width or y1 >= image.height:
+            return False
+
+        name_y = y0 + device_dict['name'][3] - 2
+        probes.append(((x0 + 1, name_y), 123, 135))
+        probes.append(((x0 + device_dict['card_width'] // 2, y1), 18, 30))
+
+    matched = 0
+    for xy, low, high in probes:
+        pixel = image.getpixel(xy)[0:3]
+        if all(low <= x <= high for x in pixel):
+            matched += 1
+
+    return matched >= len(probes) * 0.8
+
+
+def load_layouts(filename: str = LAYOUT_FILE):
+    LAYOUTS.clear()
+    if os.path.exists(filename):
+        with open(filename, encoding='utf-8') as f:
+            LAYOUTS.update(json.load(f))
+
+
+def save_layouts(filename: str = LAYOUT_FILE):
+    # Written to a temporary file first: pool workers may save at once
+    temp = f'{filename}.{os.getpid()}'
+    with open(temp, 'w', encoding='utf-8') as f:
+        json.dump(LAYOUTS, f, indent=1)
+
+    os.replace(temp, filename)
+
+
+def get_layout(image: Image.Image) -> dict:
+    '''
+    Input: Screenshot
+    Output: device_dict of a cached layout or DEVICE preset whose
+    fingerprint matches, otherwise a new scan (saved to LAYOUT_FILE).
+    A last page of one row or column fails both, its cards are counted
+    from the preset corner instead.
+    '''
+    if not LAYOUTS:
+        load_layouts()
+
+    size = f'{image.width}x{image.height}'
+    candidates = LAYOUTS.get(size, [])
+    for key in (size, f'{image.height}x{image.width}'):
+        if key in DEVICE:
+            candidates = candidates + [DEVICE[key]]
+
+    for device_dict in candidates:
+        if check_layout(image, device_dict):
+            grid = grid_size(image, device_dict)
+            if grid != tuple(device_dict['cards_count']):
+                device_dict = dict(device_dict, cards_count=grid)
+
+            return device_dict
+
+    device_dict = scan_coords_fast(image)
+    if device_dict and check_layout(image, device_dict):
+        LAYOUTS.setdefault(size, []).append(device_dict)
+        save_layouts()
+
+    if not device_dict:
+        for candidate in candidates:
+            candidate = dict(candidate,
+                             cards_count=grid_size(image, candidate))
+            if check_layout(image, candidate):
+                return candidate
+
+    return device_dict
+
+
+def panel_boxes(device_dict: dict,
+                measured: bool = True) -> list[tuple[int]]:
+    '''
+    Card-relative height, leg and price boxes: the DEVICE measurements
+    when the layout has them (and measured is True), otherwise
+    PANEL_FIELDS of the whole panel height
+    '''
+    boxes = []
+    panel = device_dict['panel']
+    for field, (left, right) in PANEL_FIELDS.items():
+        if measured is True and field in device_dict:
+            boxes.append(tuple(device_dict[field]))
+        else:
+            boxes.append((int(panel[2] * left), panel[1],
+                          int(panel[2] * right), panel[3]))
+
+    return boxes
+
+
+def configure_reader(**kwargs):
+    '''
+    Change READER_CONFIG (languages, detector, model_dir, threads, gpu).
+    The reader is rebuilt on its next use.
+    '''
+    global READER
+    for key in kwargs:
+        if key not in READER_CONFIG:
+            raise KeyError(key)
+
+    READER_CONFIG.update(kwargs)
+    READER = None
+
+
+def get_reader():
+    '''
+    The easyocr reader, built on first use so that importing this module
+    doesn't load torch or the models. detector=False loads only the
+    recognizer (the text detector is then never used).
+    '''
+    global READER
+    if READER is None:
+        import easyocr
+
+        if READER_CONFIG['threads'] is not None:
+            import torch
+            torch.set_num_threads(READER_CONFIG['threads'])
+
+        READER = easyocr.Reader(
+            READER_CONFIG['languages'], gpu=READER_CONFIG['gpu'],
+            model_storage_directory=READER_CONFIG['model_dir'],
+            detector=READER_CONFIG['detector'])
+
+    return READER
+
+
+def stat_boxes(device_dict: dict) -> list[tuple[int]]:
+    '''
+    Card-relative boxes of the 8 stat tiles, row by row
+    '''
+    boxes = []
+    x0, y0 = device_dict['stats_topleft_coords']
+    size = device_dict['stats_size']
+    for count_y in range(2):
+        y = y0 + count_y * (size + device_dict['stats_height_space'])
+        for count_x in range(4):
+            x = x0 + count_x * (size + device_dict['stats_width_space'])
+            boxes.append((x, y, x + size, y + size))
+
+    return boxes
+
+
+def uses_detector(detect: bool) -> bool:
+    '''
+    Output: detect, unless the reader was built without the detector
+    '''
+    return detect is True and READER_CONFIG['detector'] is not False
+
+
+def read_text(image: Image.Image, allowlist: str = None,
+              detect: bool = True) -> tuple[list[str], float]:
+    '''
+    READER.readtext on a crop
+    Output: Texts and the confidence of the least certain one (0 when
+    nothing was read). With detect=False the CRAFT detector is skipped
+    and the whole crop is sent to the recognizer as a single horizontal
+    box.
+    '''
+    return read_batch([image], allowlist, detect)[0]
+
+
+def read_batch(images: list[Image.Image], allowlist: str = None,
+               detect: bool = True) -> list[tuple[list[str], float]]:
+    '''
+    read_text for many crops at once. With detect=False the crops are
+    stacked into one canvas and recognized by a single batched
+    READER.recognize call, otherwise crops of the same size go through
+    READER.readtext_batched.
+    '''
+    texts = [([], 0.0) for _ in images]
+    if images == []:
+        return texts
+
+    detect = uses_detector(detect)
+    if detect is True:
+        groups: dict[tuple, list[int]] = {}
+        for i, image in enumerate(images):
+            groups.setdefault(image.size, []).append(i)
+
+        for indexes in groups.values():
+            arrays = [numpy.asarray(images[i]) for i in indexes]
+            batch = get_reader().readtext_batched(
+                arrays, allowlist=allowlist, detail=1,
+                batch_size=len(arrays))
+            for i, result in zip(indexes, batch):
+                texts[i] = ([x[1] for x in result],
+                            float(min((x[2] for x in result), default=0)))
+
+        return texts
+
+    canvas = Image.new('RGB', (max(x.width for x in images),
+                               sum(x.height for x in images)))
+    boxes = []
+    rows = {}
+    y = 0
+    for i, image in enumerate(images):
+        canvas.paste(image.convert('RGB'), (0, y))
+        boxes.append([0, image.width, y, y + image.height])
+        rows[y] = i
+        y += image.height
+
+    for box, text, confidence in get_reader().recognize(
+            numpy.asarray(canvas), horizontal_list=boxes, free_list=[],
+            allowlist=allowlist, detail=1, batch_size=len(boxes)):
+        texts[rows[box[0][1]]] = ([text], float(confidence))
+
+    return texts
+
+
+def read_jobs(jobs: list[tuple], detect: bool = True) -> dict:
+    '''
+    Input: (key, image, allowlist) jobs
+    Output: {key: (texts, confidence)}, one read_batch call per
+    allowlist
+    '''
+    groups: dict[str, list[tuple]] = {}
+    for key, image, allowlist in jobs:
+        groups.setdefault(allowlist, []).append((key, image))
+
+    texts = {}
+    for allowlist, group in groups.items():
+        batch = read_batch([x[1] for x in group], allowlist, detect)
+        texts.update(zip([x[0] for x in group], batch))
+
+    return texts
+
+
+def read_variants(jobs: list[tuple], detect: bool = True,
+                  cache: bool = True) -> dict:
+    '''
+    Input: (key, crop, variant, allowlist) jobs
+    Output: {key: (texts, confidence)}. A crop is only preprocessed and
+    recognized when dls_cache has no result for it.
+    '''
+    texts = {}
+    crop_keys = {}
+    # The key records how the crop is really read
+    detect = uses_detector(detect)
+    if cache is True:
+        # Results of other languages can't be reused
+        languages = '+'.join(READER_CONFIG['languages'])
+        for key, image, variant, allowlist in jobs:
+            crop_keys[key] = dls_cache.crop_key(
+                image, f'{variant}/{languages}', allowlist, detect)
+
+        found = dls_cache.get_many(list(crop_keys.values()))
+        for key, crop_key in crop_keys.items():
+            if crop_key in found:
+                texts[key] = tuple(found[crop_key])
+
+    result = read_jobs([(key, preprocess(image, variant), allowlist)
+                        for key, image, variant, allowlist in jobs
+                        if key not in texts], detect)
+    texts.update(result)
+    if cache is True:
+        dls_cache.put_many({crop_keys[key]: text
+                            for key, text in result.items()})
+
+    return texts
+
+
+def card_images(card: Image.Image, device_dict: dict) -> tuple:
+    '''
+    Crops shown by check_gui: card, name, overall, position, stats and
+    the panel halves (height, leg, price; height and leg share the left
+    half)
+    '''
+    panel_image = card.crop(device_dict['panel'])
+    panel_image_1 = panel_image.crop(
+        (0, 0, panel_image.width // 2, panel_image.height))
+    panel_image_2 = panel_image.crop(
+        (panel_image.width // 2, 0,
+         panel_image.width, panel_image.height))
+    return (card, card.crop(device_dict['name']),
+            card.crop(device_dict['overall']),
+            card.crop(device_dict['position']),
+            [card.crop(box) for box in stat_boxes(device_dict)],
+            panel_image_1, panel_image_1, panel_image_2)
+
+
+@lru_cache(maxsize=SCREENSHOTS)
+def decode_screenshot(filename: str, modified: int) -> Image.Image:
+    image = Image.open(filename)
+    image.load()
+    return image
+
+
+def screenshot(filename: str) -> Image.Image:
+    '''
+    Decoded screenshot, the last SCREENSHOTS are kept (the cards of one
+    screenshot are reviewed one after the other) until the file changes
+    '''
+    return decode_screenshot(filename, os.stat(filename).st_mtime_ns)
+
+
+def player_images(stats_list: tuple) -> tuple:
+    '''
+    Input: Player tuple
+    Output: Its card_images, cropped again from the screenshot
+    '''
+    filename, box, device_dict = stats_list[0]
+    return card_images(crop_card(screenshot(filename), box), device_dict)
+
+
+def parse_cards(cards: list[tuple[Image.Image, dict]],
+                detect: bool = False, digits: bool = True,
+                cache: bool = True, check: bool = True,
+                adaptive: bool = True) -> list[tuple[int, tuple]]:
+    '''
+    Input: Cards with the layout of their screenshot
+    Output: (card index, player values) of the parsed players
+    The crops of all cards are recognized together: names first, then
+    one pass per rung of the LADDERS with only the fields that are
+    still empty. With digits=True numeric fields are read by the
+    dls_digits templates first and only doubtful ones reach the OCR.
+    cache=True reuses the results of crops read before (dls_cache).
+    check=True skips players already updated in the workbook.
+    adaptive=True orders the rungs of every ladder by their success on
+    the card layout (dls_ladder) and records the results.
+    The last player value is the list of the field confidences, in
+    check_gui order (name, overall, position, stats, height, leg, price).
+    '''
+    t1 = perf_counter()
+    dls_metrics.count('cards', len(cards))
+    # Without the detector the panel can only be read field by field
+    detect = uses_detector(detect)
+    with dls_metrics.timer('name_ocr'):
+        readings = read_variants(
+            [(index, card.crop(device_dict['name']), LADDERS['name'][0],
+              None) for index, (card, device_dict) in enumerate(cards)],
+            detect, cache)
+
+    players = []
+    for index, (card, device_dict) in enumerate(cards):
+        player_name = readings[index][0]
         if player_name == [] or not bool(player_name[0].strip()) or \
                 player_name[0].strip().lower() in ['神秘球员', 'secret player']:
             continue
 
         player_name = player_name[0].title().strip('_')
-        k = check_has_player(player_name)
-        if k is not None and k[1] is True:
+        if check is True and player_updated(player_name):
             continue
 
-        if output is not True:
-            pbar.set_description(f'Processing {player_name}')
+        players.append((card, device_dict, player_name, index))
+
+    texts = {}
+    confidences = {}
+
+    def update(readings: dict):
+        for key, (text, confidence) in readings.items():
+            texts[key] = text
+            confidences[key] = confidence
+
+    fields = []
+    images = {}
+    with dls_metrics.timer('crop'):
+        for i, (card, device_dict, _, _) in enumerate(players):
+            for j, box in enumerate(stat_boxes(device_dict)):
+                images[i, j] = card.crop(box)
+                fields.append(((i, j), 'stat', DIGITS))
+
+            images[i, 'overall'] = card.crop(device_dict['overall'])
+            fields.append(((i, 'overall'), 'overall', DIGITS))
+            images[i, 'position'] = card.crop(device_dict['position'])
+            fields.append(((i, 'position'), 'position', None))
+            if detect is True:
+                images[i, 'panel'] = card.crop(device_dict['panel'])
+                fields.append(((i, 'panel'), 'panel', None))
+            else:
+                for field, box, allowlist in zip(
+                        ('height', 'leg', 'price'), panel_boxes(device_dict),
+                        (DIGITS, None, DIGITS + ',')):
+                    images[i, field] = card.crop(box)
+                    fields.append(((i, field), 'panel', allowlist))
+
+    # Digit templates and ladders are learned per source layout
+    layouts = [dls_digits.layout_key(x[1]) for x in players]
+    if digits is True:
+        with dls_metrics.timer('digits'):
+            for key, ladder, allowlist in fields[:]:
+                if allowlist is None:
+                    continue
+
+                text, confidence = dls_digits.read_digits(
+                    images[key], layouts[key[0]])
+                if confidence >= dls_digits.THRESHOLD:
+                    update({key: ([text], confidence)})
+                    fields.remove((key, ladder, allowlist))
+                    dls_metrics.count(f'{ladder}_digits')
+
+    ladders = {key: dls_ladder.ladder(layouts[key[0]], ladder)
+               if adaptive is True else LADDERS[ladder]
+               for key, ladder, _ in fields}
+    rung = 0
+    while fields != []:
+        jobs = [(key, images[key], ladders[key][rung], allowlist)
+                for key, ladder, allowlist in fields]
+        with dls_metrics.timer('field_ocr' if rung == 0 else
+                               'fallback_ocr'):
+            update(read_variants(jobs, detect, cache))
+
+        for key, ladder, _ in fields:
+            # By variant, the rungs are reordered and dropped (dls_ladder)
+            variant = ladders[key][rung]
+            win = texts[key] not in [[], ['']]
+            dls_metrics.count(f'{ladder}_{variant}_try')
+            if win is True:
+                dls_metrics.count(f'{ladder}_{variant}_hit')
+
+            if adaptive is True:
+                dls_ladder.record(layouts[key[0]], ladder, variant, win)
+
+        rung += 1
+        fields = [x for x in fields if texts[x[0]] in [[], ['']] and
+                  rung < len(ladders[x[0]])]
+
+    # Panels with an empty field are read again: by the detector, or
+    # without it from the PANEL_FIELDS of the whole panel height
+    detector = uses_detector(True)
+    panels = []
+    if detect is False:
+        for i, (card, device_dict, _, _) in enumerate(players):
+            empty = [x for x in ('height', 'leg', 'price')
+                     if texts[i, x] in [[], ['']]]
+            if empty == []:
+                continue
 
+            if detector is True:
+                panels.append(((i, 'panel'),
+                               card.crop(device_dict['panel']), 'plain',
+                               None))
+                continue
+
+            for field, box in zip(('height', 'leg', 'price'),
+                                  panel_boxes(device_dict, False)):
+                if field in empty:
+                    panels.append(((i, field), card.crop(box), 'plain',
+                                   None))
+
+    dls_metrics.count('panel_fallback', len(panels))
+    with dls_metrics.timer('panel_ocr'):
+        update(read_variants(panels, detector, cache))
+
+    t2 = perf_counter()
+    duration = f'Time: {round((t2 - t1) / max(len(players), 1), 2)}s'
+    result = []
+    for i, (card, device_dict, player_name, index) in enumerate(players):
+        panel = ('height', 'leg', 'price')
+        if (i, 'panel') in confidences:
+            panel = ['panel'] * 3
+
+        field_confidences = [readings[index][1]] + \
+            [confidences[i, x] for x in ('overall', 'position', *range(8),
+                                         *panel)]
         stats = []
-        stats_images = []
-        x0 = device_dict['stats_topleft_coords'][0]
-        count_x = 0
-        while count_x < 4:
-            y0 = device_dict['stats_topleft_coords'][1]
-            x1 = x0 + device_dict['stats_size']
-            count_y = 0
-            while count_y < 2:
-                y1 = y0 + device_dict['stats_size']
-                stat = card.crop((x0, y0, x1, y1))
-                stats_images.append(stat)
-                # pixels = stat.load()
-                # width, height = stat.size
-                # for y in range(height):
-                #     for x in range(width):
-                #         if 150 <= sum(pixels[x, y]) <= 210:
-                #             pixels[x, y] = (255, 255, 255)
-                #         else:
-                #             pixels[x, y] = (0, 0, 0)
-
-                stat_text = READER.readtext(numpy.asarray(stat), detail=False)
-                if stat_text in [[], ['']]:
-                    pixels = stat.load()
-                    width, height = stat.size
-                    for y in range(height):
-                        for x in range(width):
-                            if pixels[x, y][0] >= 150 and \
-                                    sum(pixels[x, y][1:3]) <= 100:
-                                pixels[x, y] = (255, 255, 255)
-                            else:
-                                pixels[x, y] = (0, 0, 0)
-
-                    stat = stat.resize((stat.size[0] * 4, stat.size[1] * 4),
-                                       resample=Image.BILINEAR)
-                    stat_text = READER.readtext(numpy.asarray(stat),
-                                                detail=False)
-                    if stat_text in [[], ['']]:
-                        stat_text = ['']
-                        stat = stat.resize(
-                            (stat.size[0] * 6, stat.size[1] * 6),
-                            resample=Image.NEAREST)
-                        stat_text = READER.readtext(numpy.asarray(stat),
-                                                    detail=False)
-                        if stat_text in [[], ['']]:
-                            stat_text = ['']
-
-                stats.append(stat_text[0])
-                count_y += 1
-                y0 = y1 + device_dict['stats_height_space']
-
-            count_x += 1
-            x0 = x1 + device_dict['stats_width_space']
-
-        temp_stats = [stats[0], stats[2], stats[4], stats[6],
-                      stats[1], stats[3], stats[5], stats[7]]
-        stats_images = [stats_images[0], stats_images[2],
-                        stats_images[4], stats_images[6],
-                        stats_images[1], stats_images[3],
-                        stats_images[5], stats_images[7]]
-        stats = []
-        for x in temp_stats:
+        for j in range(8):
+            stat_text = texts[i, j]
+            if stat_text in [[], ['']]:
+                stat_text = ['']
+
             try:
-                stats.append(int(x))
+                stats.append(int(stat_text[0]))
             except ValueError:
                 stats.append(0)
+                field_confidences[3 + j] = 0.0
 
         player_name = [x.replace('。', '.').replace('Vinijr.',
                                                    'Vinicius Junior')
                        for x in player_name.strip().split(' ', maxsplit=1)]
         club, nationality = '', ''
-        overall_image = card.crop(device_dict['overall'])
-        overall_ori = overall_image.copy()
-        overall_image = overall_image.resize(
-            (overall_image.size[0] * 6, overall_image.size[1] * 6),
-            resample=Image.NEAREST)
-        overall = READER.readtext(numpy.asarray(overall_image),
-                                  detail=False)
-        if overall in [[], ['']]:
-            pixels = overall_image.load()
-            width, height = overall_image.size
-            for y in range(height):
-                for x in range(width):
-                    if sum(pixels[x, y][0:3]) >= 600:
-                        pixels[x, y] = (0, 0, 0)
-                    else:
-                        pixels[x, y] = (255, 255, 255)
-
-            overall = READER.readtext(numpy.asarray(overall_image),
-                                      detail=False)
-
-        overall = overall[0].strip()
         try:
-            panel_image = card.crop(device_dict['panel'])
-            txt = READER.readtext(numpy.asarray(panel_image),
-                                  detail=False)
+            overall = texts[i, 'overall'][0].strip()
+            txt = texts.get((i, 'panel'))
+            if txt is None:
+                txt = [''.join(texts[i, x])
+                       for x in ('height', 'leg', 'price')]
+
             height = txt[0].strip().strip(ascii_letters)
             leg = txt[1].strip().lower()
             price = txt[2].strip()
-            # height_image = card.crop(device_dict['height'])
-            # height = READER.readtext(numpy.asarray(height_image),
-            #                          detail=False)[0].strip()
-            # leg_image = card.crop(device_dict['leg'])
-            # leg = READER.readtext(numpy.asarray(leg_image),
-            #                       detail=False)[0].strip().lower()
-            # price_image = card.crop(device_dict['price'])
-            # price: str = READER.readtext(numpy.asarray(price_image),
-            #                              detail=False)[0].strip()
             price = price.replace(',', '').replace('，', '').replace(' ', '')
             if leg in ['left', '左']:
                 leg = 'L'
@@ -455,330 +1165,1235 @@ def parse_image(image_dir: str,
             elif leg in ['both', '双', '双脚']:
                 leg = 'B'
 
-            position_image = card.crop(device_dict['position'])
-            pos_image2 = position_image.resize(
-                (position_image.size[0] * 4, position_image.size[1] * 4),
-                resample=Image.BILINEAR)
-            position: str = READER.readtext(numpy.asarray(pos_image2),
-                                            detail=False)
+            position = texts[i, 'position']
             if position in [[], ['']]:
-                position: str = READER.readtext(numpy.asarray(position_image),
-                                                detail=False)
-                if position in [[], ['']]:
-                    position = ['']
+                position = ['']
 
             position = position[0].strip().upper()
             pos_table = str.maketrans({'N': 'M', '8': 'B',
                                        '1': 'L', 'I': '', '[': 'L'})
             position = position.translate(pos_table)
 
-            t2 = perf_counter()
-            panel_image_1 = panel_image.crop(
-                (0, 0, panel_image.width // 2, panel_image.height))
-            panel_image_2 = panel_image.crop(
-                (panel_image.width // 2, 0,
-                 panel_image.width, panel_image.height))
-            player_tuple = ((card, name_image_ori, overall_ori,
-                             position_image, stats_images,
-                             panel_image_1, panel_image_1, panel_image_2),
-                            (club, nationality), ' '.join(player_name),
-                            int(overall), position, stats,
-                            int(height), leg, int(price),
-                            f'Time: {round(t2 - t1, 2)}s')
-            result.append(player_tuple)
-            if output is True:
-                print(player_tuple[1:][1:])
-
+            result.append((index, ((club, nationality), ' '.join(player_name),
+                                   int(overall), position, stats,
+                                   int(height), leg, int(price), duration,
+                                   field_confidences)))
         except Exception:
             card.show()
 
     return result
 
 
+def list_images(image_dir: str, max_file: int = -1,
+                rename: bool = True) -> list[str]:
+    '''
+    Input: Transfer market screenshot directory
+    Output: Screenshots that were not parsed before (renamed to _OLD
+    when rename is True)
+    '''
+    filenames = []
+    for image_file in os.listdir(image_dir):
+        filename = image_dir + os.sep + image_file
+        if '.' not in image_file or image_file[0] == '.':
+            continue
+
+        stem, extension = os.path.splitext(filename)
+        if stem.endswith('_OLD'):
+            continue
+
+        if len(filenames) == max_file:
+            break
+
+        try:
+            Image.open(filename).close()
+            if rename is not False:
+                os.rename(filename, stem + '_OLD' + extension)
+                filename = stem + '_OLD' + extension
+        except Exception:
+            continue
+
+        filenames.append(filename)
+
+    return filenames
+
+
+def screenshot_layout(image: Image.Image) -> dict:
+    '''
+    get_layout, {} (no cards) when the screenshot has none
+    '''
+    with dls_metrics.timer('layout'):
+        try:
+            return get_layout(image)
+        except Exception:
+            # Not a market screenshot: no cards, the run goes on
+            return {}
+
+
+def screenshot_cards(filename: str, device_dict: dict = None,
+                     image: Image.Image = None) -> list[tuple]:
+    '''
+    Input: Screenshot file, its device_dict if already known (and the
+    opened screenshot)
+    Output: (card resampled to CARD_SIZE, card layout, card box on the
+    screenshot) of every card on it
+    '''
+    if image is None:
+        image = Image.open(filename)
+
+    if device_dict is None:
+        device_dict = screenshot_layout(image)
+
+    if not device_dict:
+        return []
+
+    with dls_metrics.timer('crop'):
+        layout = card_layout(device_dict)
+        return [(crop_card(image, box), layout, box)
+                for box in card_boxes(device_dict)]
+
+
+def init_worker(config: dict):
+    '''
+    Process pool initializer: every worker builds its own reader once
+    '''
+    configure_reader(**config)
+    get_reader()
+    dls_digits.load_templates()
+    dls_ladder.load_stats()
+
+
+def parse_file(filename: str, options: dict, indexes: list[int] = None,
+               device_dict: dict = None) -> tuple[int, list, dict, dict,
+                                                  dict]:
+    '''
+    Worker side of parse_image(workers=N), options are parse_cards
+    arguments, indexes the cards to parse (default all) and device_dict
+    the layout the parent already found (default get_layout)
+    Output: Number of cards, (card index, card box, layout, player
+    values) of the parsed players, the dls_cache counters, the
+    dls_metrics and the new dls_ladder stats of this file. No images are
+    sent back.
+    '''
+    stats = dict(dls_cache.STATS)
+    dls_metrics.reset()
+    cards = screenshot_cards(filename, device_dict)
+    if indexes is None:
+        indexes = list(range(len(cards)))
+
+    result = parse_cards([cards[i][:2] for i in indexes], check=False,
+                         **options)
+    for key in stats:
+        stats[key] = dls_cache.STATS[key] - stats[key]
+
+    players = []
+    for index, values in result:
+        index = indexes[index]
+        players.append((index, cards[index][2], cards[index][1], values))
+
+    return len(cards), players, stats, dls_metrics.snapshot(), \
+        dls_ladder.take()
+
+
+def new_cards(filename: str) -> tuple[list[int], dict]:
+    '''
+    Output: Indexes of the cards of the screenshot that dls_dedup
+    hasn't seen yet, device_dict of the screenshot (passed to the
+    worker, so its layout is found once)
+    '''
+    image = Image.open(filename)
+    device_dict = screenshot_layout(image)
+    return [index for index, (card, layout, box)
+            in enumerate(screenshot_cards(filename, device_dict, image))
+            if not dls_dedup.check(card, card.crop(layout['name']))], \
+        device_dict
+
+
+def parse_parallel(filenames: list[str], workers: int, max_cards: int = -1,
+                   dedup: bool = True, **options):
+    '''
+    Spread the screenshots over a process pool. At most
+    MAX_PENDING * workers screenshots are in flight and the results are
+    yielded in input order as (filename, number of cards, [(card index,
+    card box, layout, player values)], complete), complete is
+    False for a screenshot cut by max_cards.
+    dedup=True hashes the cards here, in input order, and only sends the
+    new ones to the workers, with the layout found for the hashes.
+    '''
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+
+    config = dict(READER_CONFIG)
+    if config['threads'] is None:
+        config['threads'] = max(1, (os.cpu_count() or 1) // workers)
+
+    count = 0
+    with ProcessPoolExecutor(workers, initializer=init_worker,
+                             initargs=(config,)) as pool:
+        pending = deque()
+        filenames = iter(filenames)
+        while True:
+            for filename in filenames:
+                indexes, device_dict = new_cards(filename) \
+                    if dedup is True else (None, None)
+                pending.append((filename, pool.submit(
+                    parse_file, filename, options, indexes, device_dict)))
+                if len(pending) >= MAX_PENDING * workers:
+                    break
+
+            if not pending:
+                break
+
+            filename, future = pending.popleft()
+            cards, players, stats, metrics, ladders = future.result()
+            for key in stats:
+                dls_cache.STATS[key] += stats[key]
+
+            dls_metrics.merge(metrics)
+            dls_ladder.merge(ladders)
+
+            result = []
+            for index, box, device_dict, values in players:
+                if max_cards != -1 and count + index >= max_cards:
+                    break
+
+                if player_updated(values[1]):
+                    continue
+
+                result.append((index, box, card_layout(device_dict), values))
+
+            complete = max_cards == -1 or count + cards <= max_cards
+            count += cards
+            yield filename, cards, result, complete
+            if max_cards != -1 and count >= max_cards:
+                for _, future in pending:
+                    future.cancel()
+
+                break
+
+
+def generate_players(image_dir: str,
+                     max_file: int = -1, max_cards: int = -1,
+                     output: bool = False, rename: bool = False,
+                     restore: bool = False, detect: bool = False,
+                     window: int = 9, digits: bool = True,
+                     workers: int = 1, cache: bool = True,
+                     dedup: bool = True, manifest: bool = True,
+                     metrics: bool = True, profile: bool = False,
+                     adaptive: bool = True, filenames=None):
+    '''
+    Input: Transfer market screenshot directory
+    Output: Player tuples, yielded as soon as their window is parsed.
+    The first item is the (screenshot file, card box, card layout) the
+    review crops the card images from (player_images), no images are
+    kept. The last item is the (file key, card index) source of the
+    player for dls_manifest (None when manifest is False).
+    detect=False (the default, the detector used to run on every crop)
+    sends the known boxes straight to the recognizer: the height, leg
+    and price are read from their own boxes and the whole panel only
+    goes to the detector when one of them is empty. detect=True runs
+    the detector on every crop and reads the panel whole. The crops of
+    whole screenshots are recognized in shared batches of at least
+    `window` cards.
+    digits=True reads numbers with the dls_digits templates when they
+    are confident enough.
+    workers > 1 parses the screenshots in a process pool.
+    cache=True skips the OCR of crops read in earlier runs (dls_cache).
+    dedup=True drops cards seen earlier in the run or written in an
+    earlier one before any OCR (dls_dedup), as long as the written
+    player is still marked updated.
+    manifest=True checkpoints every parsed screenshot by content hash
+    (dls_manifest): reviewed ones are skipped, parsed ones are resumed
+    without OCR and the ones without players are parsed again. rename=True is the old way, screenshots are
+    renamed to _OLD and restore=True renames them back.
+    metrics=True times the stages and counts the fallbacks (dls_metrics)
+    and exports them at the end, and again after check_gui writes.
+    profile=True also runs cProfile over the parse (dls_profile.pstats).
+    adaptive=True learns the best preprocessing rungs of every layout
+    (dls_ladder, saved at the end).
+    filenames are the screenshots to parse instead of the ones
+    list_images finds, any iterable, read lazily (dls_watch passes new
+    files as they arrive).
+    '''
+    dls_metrics.reset()
+    dls_metrics.ENABLED = metrics
+    if profile is True:
+        dls_metrics.start_profile()
+
+    if restore is True:
+        for image_file in os.listdir(image_dir):
+            filename = image_dir + os.sep + image_file
+            fn2 = filename.replace('_OLD', '')
+            os.rename(filename, fn2)
+
+    if digits is True:
+        dls_digits.load_templates()
+
+    if dedup is True:
+        dls_dedup.load_hashes(player_updated)
+
+    if adaptive is True:
+        dls_ladder.load_stats()
+
+    if output is not True:
+        from tqdm import tqdm
+
+        pbar = tqdm(unit='card')
+
+    def player_tuple(card, values, source):
+        values = list(values)
+        values[1], ambiguous = resolve_name(values[1])
+        if ambiguous is True:
+            # check_gui marks the name for review
+            values[-1] = [0.0, *values[-1][1:]]
+
+        player = (card, *values, source)
+        if output is True:
+            print(player[1:][1:])
+        else:
+            pbar.set_description(f'Processing {player[2]}')
+
+        return player
+
+    keys = {}
+    if filenames is None:
+        filenames = list_images(image_dir, max_file, rename)
+
+    def screenshots():
+        '''
+        Output: (filename, None) of the screenshots to parse and
+        (filename, players) of the ones replayed from dls_manifest
+        '''
+        for filename in filenames:
+            if manifest is not True:
+                yield filename, None
+                continue
+
+            key = dls_manifest.file_key(filename)
+            stage = dls_manifest.file_stage(key)
+            # Empty ones too: the layout may not have been found
+            if stage in (None, 'empty'):
+                keys[filename] = key
+                yield filename, None
+            elif stage == 'parsed':
+                yield filename, list(replay(filename, key))
+
+    def replay(filename, key):
+        for index, box, device_dict, values in \
+                dls_manifest.parsed_players(key):
+            # Layouts checkpointed before CARD_SIZE are native
+            device_dict = card_layout(device_dict)
+            if dedup is True:
+                card = crop_card(screenshot(filename), box)
+                if dls_dedup.check(card, card.crop(device_dict['name'])):
+                    continue
+
+            yield player_tuple((filename, box, device_dict), values,
+                               (key, index))
+
+    options = {'detect': detect, 'digits': digits, 'cache': cache,
+               'adaptive': adaptive}
+
+    def parse():
+        if workers > 1:
+            replayed = []
+
+            def to_parse():
+                for filename, players in screenshots():
+                    if players is None:
+                        yield filename
+                    else:
+                        replayed.extend(players)
+
+            for filename, cards, players, complete in parse_parallel(
+                    to_parse(), workers, max_cards, dedup, **options):
+                yield from replayed
+                replayed.clear()
+                key = keys.get(filename)
+                if key is not None and complete is True:
+                    dls_manifest.checkpoint(key, filename, players)
+
+                for index, box, device_dict, values in players:
+                    yield player_tuple((filename, box, device_dict), values,
+                                       key and (key, index))
+
+                if output is not True:
+                    pbar.update(cards)
+
+            yield from replayed
+            return
+
+        def parse_window(cards, sources, finished):
+            '''
+            sources are the (filename, card index, card box) of the cards,
+            the players of the finished screenshots are checkpointed before
+            they are yielded
+            '''
+            players = parse_cards(cards, **options)
+            parsed = {filename: [] for filename in finished}
+            for index, values in players:
+                filename, card, box = sources[index]
+                if filename in parsed:
+                    parsed[filename].append((card, box, cards[index][1],
+                                             values))
+
+            for filename in finished:
+                if keys.get(filename) is not None:
+                    dls_manifest.checkpoint(keys[filename], filename,
+                                            parsed[filename])
+
+            for index, values in players:
+                filename, card, box = sources[index]
+                yield player_tuple((filename, box, cards[index][1]), values,
+                                   keys.get(filename) and
+                                   (keys[filename], card))
+
+            if output is not True:
+                pbar.update(len(cards))
+
+        cards: list[tuple[Image.Image, dict]] = []
+        sources = []
+        finished = []
+        count = 0
+        for filename, players in screenshots():
+            if players is not None:
+                yield from players
+                continue
+
+            for index, (card, device_dict, box) in \
+                    enumerate(screenshot_cards(filename)):
+                if count == max_cards:
+                    break
+
+                if dedup is True and \
+                        dls_dedup.check(card, card.crop(device_dict['name'])):
+                    continue
+
+                cards.append((card, device_dict))
+                sources.append((filename, index, box))
+                count += 1
+            else:
+                finished.append(filename)
+
+            if count == max_cards:
+                break
+
+            if len(cards) >= window:
+                yield from parse_window(cards, sources, finished)
+                cards, sources, finished = [], [], []
+
+        yield from parse_window(cards, sources, finished)
+
+    try:
+        yield from parse()
+    finally:
+        # Also when the consumer stops early (the review window closed)
+        print_reports(cache, dedup, metrics, adaptive)
+
+
+def print_reports(cache: bool, dedup: bool, metrics: bool = True,
+                  adaptive: bool = True):
+    if cache is True:
+        print(dls_cache.report())
+
+    if dedup is True:
+        print(dls_dedup.report())
+
+    if adaptive is True:
+        dls_ladder.save_stats()
+        print(dls_ladder.report())
+
+    dls_metrics.stop_profile()
+    if metrics is True:
+        print(dls_metrics.report())
+        dls_metrics.export()
+
+
+def iter_players(image_dir: str, queue_size: int = QUEUE_SIZE, **kwargs):
+    '''
+    Same arguments as parse_image, but yields each player as soon as it
+    is ready. The OCR runs in a background thread at most queue_size
+    players ahead of the consumer, so the review can start while later
+    cards are still being recognized.
+    '''
+    done = object()
+    players = Queue(queue_size)
+    stop = Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                players.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+
+        return False
+
+    def produce():
+        # Closed when the consumer stops early, generate_players still
+        # saves what it learned and prints its reports
+        try:
+            with closing(generate_players(image_dir, **kwargs)) as result:
+                for player_tuple in result:
+                    if put(player_tuple) is False:
+                        return
+
+            put(done)
+        except Exception as e:
+            put(e)
+
+    producer = Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = players.get()
+            if item is done:
+                break
+
+            if isinstance(item, Exception):
+                raise item
+
+            yield item
+
+    finally:
+        stop.set()
+        producer.join()
+
+
+def parse_image(image_dir: str, **kwargs) -> list[tuple]:
+    '''
+    Input: Transfer market screenshot directory (and the options of
+    generate_players)
+    Output: Players and stats
+    '''
+    return list(generate_players(image_dir, **kwargs))
+
+
 # def on_key(event):
 #     keycode = event.keycode
 #     if keycode in [13, 32]:
 #         root.quit()
 
 
-def get_font(number):
+def font_color(number) -> str:
     if number == 'NEW':
-        color = '00ff00'
-    else:
-        number = int(number)
-        if number >= 90:
-            color = '00ffff'
-        elif number >= 80:
-            color = '00ff00'
-        elif number >= 70:
-            color = 'ffff00'
-        elif number >= 60:
-            color = 'ff9a00'
-        else:
-            color = 'ff0000'
+        return '00ff00'
 
-    font = Font(name='Arial', size=11, bold=True, color=color)
-    return font
+    number = int(number)
+    if number >= 90:
+        return '00ffff'
+    elif number >= 80:
+        return '00ff00'
+    elif number >= 70:
+        return 'ffff00'
+    elif number >= 60:
+        return 'ff9a00'
 
+    return 'ff0000'
 
-def get_font_2(number):
+
+def font_color_2(number) -> str:
     if number == 'NEW':
-        color = '00ff00'
-    else:
-        number = int(number)
-        if number > 0:
-            color = '00ff00'
-        elif number < 0:
-            color = 'ff0000'
-        else:
-            color = 'ffffff'
+        return '00ff00'
 
-    font = Font(name='Arial', size=11, bold=True, color=color)
-    return font
+    number = int(number)
+    if number > 0:
+        return '00ff00'
+    elif number < 0:
+        return 'ff0000'
 
+    return 'ffffff'
 
-def get_fill(position):
+
+def fill_color(position) -> str:
     if position == 'GK':
-        color = '6d9dca'
+        return '6d9dca'
     elif position in ['CF', 'LW', 'RW', 'SS']:
-        color = 'd65452'
+        return 'd65452'
     elif position in ['LB', 'CB', 'RB']:
-        color = '49b147'
-    else:
-        color = 'f3d15e'
+        return '49b147'
 
-    fill = PatternFill('solid', fgColor=color)
-    return fill
+    return 'f3d15e'
 
 
-def check_has_player(player_name):
-    lst = [wb['Legendary Players'], wb['Rare Players'], wb['Common Players']]
-    for ws1 in lst:
-        players = ws1['B':'C']
-        player_names = []
-        for x in zip([x.value for x in players[0][3:]],
-                     [x.value for x in players[1][3:]]):
-            if x == (None, None):
+def get_font(number):
+    from openpyxl.styles import Font
+
+    return Font(name='Arial', size=11, bold=True, color=font_color(number))
+
+
+def get_font_2(number):
+    from openpyxl.styles import Font
+
+    return Font(name='Arial', size=11, bold=True, color=font_color_2(number))
+
+
+def get_fill(position):
+    from openpyxl.styles import PatternFill
+
+    return PatternFill('solid', fgColor=fill_color(position))
+
+
+def named_style(workbook, font: str = None, fill: str = '000000',
+                horizontal: str = 'center') -> str:
+    '''
+    Input: Workbook, font color (bold Arial, None keeps the default
+    font), fill color, horizontal alignment (None keeps the default
+    alignment)
+    Output: Name of the matching NamedStyle, added to the workbook the
+    first time
+    '''
+    from openpyxl.styles import Alignment, Font, NamedStyle, PatternFill
+
+    name = f'DLS {font} {fill} {horizontal}'
+    if name not in workbook.named_styles:
+        style = NamedStyle(name)
+        if font is not None:
+            style.font = Font(name='Arial', size=11, bold=True, color=font)
+
+        style.fill = PatternFill('solid', fgColor=fill)
+        if horizontal is not None:
+            style.alignment = Alignment(horizontal=horizontal,
+                                        vertical='bottom')
+
+        workbook.add_named_style(style)
+
+    return name
+
+
+def is_updated(cell) -> bool:
+    rgb = cell.fill.fgColor.rgb
+    return isinstance(rgb, str) and rgb[2:].lower() == '00ff00'
+
+
+def index_players(workbook):
+    '''
+    Build PLAYER_INDEX {name: [[sheet, row, updated], ...]} of the
+    player sheets in one pass. Locations are kept in sheet order, the
+    first one is the one check_has_player reports.
+    '''
+    global INDEXED_BOOK, FUZZY_ROSTER
+    PLAYER_INDEX.clear()
+    dls_fuzzy.clear()
+    for sheet in SHEETS:
+        ws = workbook[sheet]
+        for row, (a, b, c) in enumerate(ws.iter_rows(min_row=4, max_col=3),
+                                        start=4):
+            if (b.value, c.value) == (None, None):
                 continue
-            if x[0] is None:
-                x = ('', x[1])
-            player_names.append(' '.join(list(x)).lower())
 
+            PLAYER_INDEX.setdefault(player_key(b.value, c.value), []) \
+                .append([sheet, row, is_updated(a)])
+            dls_fuzzy.add(' '.join(str(x) for x in (b.value, c.value)
+                                   if x not in (None, '')))
+
+    INDEXED_BOOK = workbook
+    FUZZY_ROSTER = workbook
+
+
+def index_add(player_name: str, sheet: str, row: int, updated: bool):
+    locations = PLAYER_INDEX.setdefault(player_key(None, player_name), [])
+    locations.append([sheet, row, updated])
+    locations.sort(key=lambda x: (SHEETS.index(x[0]), x[1]))
+    dls_fuzzy.add(player_name)
+
+
+def index_remove(sheet: str, row: int):
+    '''
+    Forget a row that is about to be overwritten or removed
+    '''
+    for name in list(PLAYER_INDEX):
+        locations = [x for x in PLAYER_INDEX[name]
+                     if (x[0], x[1]) != (sheet, row)]
+        if locations:
+            PLAYER_INDEX[name] = locations
+        else:
+            del PLAYER_INDEX[name]
+
+
+def index_compact(sheet: str, rows: list[int]):
+    '''
+    Move the indexed rows of a sheet up past the removed rows
+    '''
+    rows = sorted(rows)
+    for locations in PLAYER_INDEX.values():
+        for location in locations:
+            if location[0] == sheet:
+                location[1] -= bisect_left(rows, location[1])
+
+
+def resolve_name(player_name: str) -> tuple[str, bool]:
+    '''
+    Input: OCR'd player name
+    Output: The roster name (wb, or dls_store when wb is None) it
+    matches through dls_fuzzy, True if the match is ambiguous and the
+    name needs a review
+    '''
+    global FUZZY_ROSTER
+    if wb is not None and INDEXED_BOOK is not wb:
+        index_players(wb)
+    elif wb is None and FUZZY_ROSTER is not dls_store:
+        dls_fuzzy.build(dls_store.names())
+        FUZZY_ROSTER = dls_store
+
+    return dls_fuzzy.lookup(player_name)
+
+
+def player_updated(player_name: str) -> bool:
+    '''
+    Output: True if the player (matched by resolve_name) is marked
+    updated in wb (or in dls_store when wb is None)
+    '''
+    player_name = resolve_name(player_name)[0]
+    if wb is None:
+        player = dls_store.find(player_name)
+        return player is not None and player['updated'] == 1
+
+    k = check_has_player(player_name)
+    return k is not None and k[1] is True
+
+
+def check_has_player(player_name):
+    if INDEXED_BOOK is not wb:
+        index_players(wb)
+
+    locations = PLAYER_INDEX.get(player_key(None, player_name))
+    if not locations:
+        return None
+
+    sheet, index, updated = locations[0]
+    return (index, wb[sheet]), updated
+
+
+def compact_sheet(ws, rows: set[int]):
+    '''
+    Remove rows in a single pass: every stored cell below the first
+    removed row is moved up once, with its formula translated, instead
+    of one delete_rows call (and shift of the whole sheet) per row
+    '''
+    from openpyxl.formula.translate import Translator
+
+    rows = sorted(rows)
+    cells = {}
+    # ws._cells is openpyxl's {(row, column): cell} store, the sheets are
+    # styled ~1000 columns wide so only the existing cells are touched
+    for (row, column), cell in ws._cells.items():
+        shift = bisect_left(rows, row)
+        if row < rows[0]:
+            cells[row, column] = cell
+        elif shift == len(rows) or rows[shift] != row:
+            value = cell.value
+            if isinstance(value, str) and value.startswith('='):
+                cell.value = Translator(value, cell.coordinate) \
+                    .translate_formula(f'{cell.column_letter}{row - shift}')
+
+            cell.row = row - shift
+            cells[row - shift, column] = cell
+
+    ws._cells = cells
+
+
+def write_row(ws, row: int, input_data: list, updated: bool = True):
+    '''
+    Write the A:W values of a player row with the shared named styles
+    '''
+    def style(font: str = None, fill: str = '000000',
+              horizontal: str = 'center') -> str:
+        return named_style(ws.parent, font, fill, horizontal)
+
+    def number_style(number, color) -> str:
         try:
-            index = player_names.index(player_name.lower()) + 4
-            fill = ws1[f'A{index}'].fill
-            updated = False
-            if fill.fgColor.rgb[2:].lower() == '00ff00':
-                updated = True
-            return (index, ws1), updated
+            return style(color(number))
+        except Exception:
+            # Empty cells and notes such as 'NEW (-1)'
+            return style()
+
+    white = style('ffffff')
+    styles = [style(None, '00ff00' if updated else '000000', None),
+              white, white, white,
+              style('ffffff', horizontal='general'),
+              style('ffffff', horizontal='general'),
+              style('000000', fill_color(input_data[6])), white,
+              number_style(input_data[8], font_color), white]
+    for number in input_data[10:20]:
+        styles.append(number_style(number, font_color))
+
+    styles += [number_style(input_data[20], font_color_2), white, white]
+    for column, (value, style_name) in enumerate(zip(input_data, styles),
+                                                 start=1):
+        cell = ws.cell(row, column)
+        cell.value = value
+        cell.style = style_name
+
+
+def player_row(data_list: list, old_rating: int = 0, old_nat: str = '',
+               old_club: str = '', player_id: str = '') -> tuple[str, list]:
+    '''
+    Input: Row submitted by check_gui, values of the existing player
+    Output: Sheet of the player and its workbook values A:W (V is left
+    for the =SUM formula)
+    '''
+    rating = int(data_list[1])
+    if rating >= 80:
+        sheet = 'Legendary Players'
+    elif rating >= 70:
+        sheet = 'Rare Players'
+    else:
+        sheet = 'Common Players'
+
+    stats = list(map(int, data_list[3:11]))
+    stats += ['', '']
+    if data_list[2] == 'GK':
+        stats[8] = stats[2]
+        stats[2] = ''
+        stats[9] = stats[6]
+        stats[6] = ''
+
+    if old_rating == 0:
+        rating_change = 'NEW'
+    else:
+        rating_change = rating - old_rating
 
-        except ValueError:
-            pass
+    player_name_list = data_list[0].split(' ', maxsplit=1)
+    if len(player_name_list) == 1:
+        player_name = ['', player_name_list[0]]
+    else:
+        player_name = [player_name_list[0], player_name_list[1]]
+
+    return sheet, ['', *player_name, data_list[-3],
+                   old_nat, old_club, data_list[2],
+                   data_list[-4], rating, data_list[-5], *stats,
+                   rating_change, '', player_id]
 
 
 def write_player_data(data):
+    '''
+    Write the checked players in one pass. A player that stays on its
+    sheet is updated in place, one that changes sheet is appended to the
+    new sheet and its old row is removed by compact_sheet at the end.
+    Only the written rows get their =SUM formula.
+    '''
+    wb['Legendary Players'].sheet_properties.tabColor = 'f5bd00'
+    wb['Rare Players'].sheet_properties.tabColor = '349bf9'
+    wb['Common Players'].sheet_properties.tabColor = 'cccccc'
+
+    removed = {sheet: set() for sheet in SHEETS}
     for data_list in data:
         k = check_has_player(data_list[0])
         if k is not None:
             index, ws1 = k[0]
-            player_id = ws1[f'W{index}'].value
-            old_rating = int(ws1[f'I{index}'].value)
-            old_nat = ws1[f'E{index}'].value
-            old_club = ws1[f'F{index}'].value
-            ws1.delete_rows(index)
-        else:
-            player_id = old_nat = old_club = ''
-            old_rating = 0
-
-        ws = wb['Legendary Players']
-        ws.sheet_properties.tabColor = 'f5bd00'
-        ws = wb['Rare Players']
-        ws.sheet_properties.tabColor = '349bf9'
-        ws = wb['Common Players']
-        ws.sheet_properties.tabColor = 'cccccc'
-
-        rating = int(data_list[1])
-        if rating >= 80:
-            ws = wb['Legendary Players']
-        elif rating >= 70:
-            ws = wb['Rare Players']
-        else:
-            ws = wb['Common Players']
-
-        stats = list(map(int, data_list[3:11]))
-        # total_stats = sum(stats)
-        stats += ['', '']
-        if data_list[2] == 'GK':
-            stats[8] = stats[2]
-            stats[2] = ''
-            stats[9] = stats[6]
-            stats[6] = ''
-
-        if old_rating == 0:
-            rating_change = 'NEW'
+            sheet, input_data = player_row(
+                data_list, int(ws1[f'I{index}'].value),
+                ws1[f'E{index}'].value, ws1[f'F{index}'].value,
+                ws1[f'W{index}'].value)
+            index_remove(ws1.title, index)
         else:
-            rating_change = rating - old_rating
+            sheet, input_data = player_row(data_list)
 
-        player_name_list = data_list[0].split(' ', maxsplit=1)
-        if len(player_name_list) == 1:
-            player_name = ['', player_name_list[0]]
+        ws = wb[sheet]
+        if k is not None and ws1 is ws:
+            row = index
         else:
-            player_name = [player_name_list[0], player_name_list[1]]
-
-        row = ws.max_row + 1
-        input_data = ['', *player_name, data_list[-3],
-                    #   data_list[-2], data_list[-1], data_list[2],
-                      old_nat, old_club, data_list[2],
-                      data_list[-4], rating, data_list[-5], *stats,
-                      rating_change,  # total_stats,
-                      '', player_id]
-        ws.append(input_data)
-
-        ws[f'A{row}'].fill = PatternFill('solid', fgColor='00ff00')
-        font1 = Font(name='Arial', size=11, bold=True, color='ffffff')
-        font2 = Font(name='Arial', size=11, bold=True, color='000000')
-        align1 = Alignment(horizontal='center', vertical='bottom')
-        align2 = Alignment(horizontal='general', vertical='bottom')
-        for x in ws[f'B{row}:W{row}']:
-            for y in x:
-                y.fill = PatternFill('solid', fgColor='000000')
-        for x in ws[f'B{row}:F{row}']:
-            for y in x:
-                y.font = font1
-        for x in ws[f'B{row}:D{row}']:
-            for y in x:
-                y.alignment = align1
-        for x in ws[f'E{row}:F{row}']:
-            for y in x:
-                y.alignment = align2
-        ws[f'G{row}'].font = font2
-        ws[f'G{row}'].fill = get_fill(data_list[2])
-        for x in ws[f'G{row}:W{row}']:
-            for y in x:
-                y.alignment = align1
-        ws[f'H{row}'].font = font1
-        ws[f'J{row}'].font = font1
-        for x in ws[f'V{row}:W{row}']:
-            for y in x:
-                y.font = font1
-
-        for i in range(8, 20):
-            if i == 9:
-                continue
-            number = input_data[i]
-            if number == '':
-                continue
+            if k is not None:
+                removed[ws1.title].add(index)
 
-            font = get_font(number)
-            cell = f'{ascii_uppercase[i]}{row}'
-            ws[cell].font = font
+            row = ws.max_row + 1
 
-        font = get_font_2(input_data[20])
-        cell = f'U{row}'
-        ws[cell].font = font
+        input_data[21] = f'=SUM(K{row}:T{row})'
+        write_row(ws, row, input_data)
+        index_add(data_list[0], ws.title, row, True)
 
-    for ws in [wb['Legendary Players'], wb['Rare Players'],
-               wb['Common Players']]:
-        for i in range(3, len(ws['V'])):
-            i += 1
-            ws[f'V{i}'] = f'=SUM(K{i}:T{i})'
+    for sheet, rows in removed.items():
+        if rows:
+            compact_sheet(wb[sheet], rows)
+            index_compact(sheet, rows)
 
     wb.save(empty_database)
     wb.close()
 
 
+def store_player_data(data):
+    '''
+    write_player_data for dls_store: the workbook is only generated by
+    export_workbook
+    '''
+    for data_list in data:
+        player = dls_store.find(data_list[0])
+        if player is not None:
+            sheet, input_data = player_row(
+                data_list, int(player['rating']), player['nationality'],
+                player['club'], player['player_id'])
+        else:
+            sheet, input_data = player_row(data_list)
+
+        dls_store.save(player, sheet, input_data[1:])
+        if FUZZY_ROSTER is dls_store:
+            dls_fuzzy.add(data_list[0])
+
+
+def export_workbook(filename: str, template: str):
+    '''
+    Input: Output file, workbook to copy the headers and the other
+    sheets from
+    Write the dls_store players in the styled three-sheet layout
+    '''
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(template)
+    workbook['Legendary Players'].sheet_properties.tabColor = 'f5bd00'
+    workbook['Rare Players'].sheet_properties.tabColor = '349bf9'
+    workbook['Common Players'].sheet_properties.tabColor = 'cccccc'
+    for sheet in SHEETS:
+        ws = workbook[sheet]
+        # Keep the header rows, same cell store as compact_sheet
+        ws._cells = {k: v for k, v in ws._cells.items() if k[0] < 4}
+        for row, (updated, values) in enumerate(dls_store.sheet_rows(sheet),
+                                                start=4):
+            values[20] = f'=SUM(K{row}:T{row})'
+            write_row(ws, row, ['', *values], updated)
+
+    workbook.save(filename)
+    workbook.close()
+
+
+def sync_store(export_file: str, template: str):
+    '''
+    Take the edits and updated flags of the last export into dls_store
+    (the template workbook on the first run)
+    '''
+    if os.path.exists(export_file):
+        dls_store.import_workbook(export_file)
+    elif dls_store.is_empty():
+        dls_store.import_workbook(template)
+
+
 all_data = []
 
 
-def callback():
-    r = []
-    for x in var:
-        r.append(x.get())
+def learn_digits(images: tuple, values: list[str], key: str):
+    '''
+    Use the crops of a submitted card as dls_digits templates of its
+    layout key
+    '''
+    dls_digits.learn(images[2], values[1], key)
+    for image, value in zip(images[4], values[3:11]):
+        dls_digits.learn(image, value, key)
+
 
-    all_data.append(r)
-    root.destroy()
+def review_fields(stats_list: tuple,
+                  images: tuple = ()) -> tuple[list, list]:
+    '''
+    Input: Player tuple, its player_images (optional)
+    Output: The crops shown by check_gui (name, overall, position,
+    stats, panel) and the values of their fields
+    '''
+    crops = []
+    for a in images[1:]:
+        if isinstance(a, (list, tuple)):
+            crops.extend(a)
+        else:
+            crops.append(a)
+
+    values = []
+    for a in stats_list[2:]:
+        if isinstance(a, (list, tuple)):
+            values.extend(a)
+        else:
+            values.append(a)
+
+    return crops, values[:REVIEW_FIELDS]
+
+
+def triage_player(stats_list: tuple, values: list) -> tuple[list, tuple]:
+    '''
+    Input: Player tuple, its review_fields values
+    Output: Indexes of its doubtful fields (None without confidences) and
+    its dls_triage.review_order key
+    '''
+    confidences = stats_list[10] if len(stats_list) > 10 else None
+    if not isinstance(confidences, list) or \
+            len(confidences) != len(values):
+        return None, (0, 1)
 
+    return dls_triage.doubtful_fields(values, confidences), \
+        dls_triage.review_order(values, confidences)
 
-def check_gui(data: list[list[list[Image.Image]]]):
+
+def check_gui(data: list[tuple], manifest: bool = True,
+              triage: bool = True, stop: Event = None):
     '''
     A gui to check the data.
+    One window is reused for every player: Enter submits, Escape skips,
+    Up/Down (or Tab) move between the fields and closing the window
+    ends the review. A background thread fetches up to PREFETCH players
+    ahead and crops their images (player_images) while the current one
+    is being checked, a player whose screenshot can't be read is skipped
+    and left for a later run.
+    manifest=True records every review in dls_manifest and first queues
+    the players reviewed in an earlier run that weren't written.
+    triage=True accepts the players dls_triage finds no doubtful field in
+    without showing them, shows the worst of the others first and only
+    marks their doubtful fields.
+    stop is set when the window is closed, the fetch thread stops and
+    closes data (iter_players then ends its parse and saves what it
+    learned) before the players are written.
     '''
-    global root, var
-    for stats_list in data:
-        root = Tk()
-        root.title('Data Checker')
-        root.resizable(width=False, height=False)
-
-        var = []
-        for x in range(16):
-            v = StringVar(root)
-            var.append(v)
-
-        # card_image = ImageTk.PhotoImage(stats_list[0][0])
-        # panel = Label(root, image=card_image)
-        # panel.grid(row=1, column=1)
-
-        image_list = stats_list[0][1:]
-        image_list_ = image_list[::]
-        image_list = []
-        for a in image_list_:
-            if isinstance(a, (list, tuple)):
-                for b in a:
-                    image_list.append(b)
-            else:
-                image_list.append(a)
-
-        stats_list_ = stats_list[2:]
-        new_stats_list = []
-        for a in stats_list_:
-            if isinstance(a, (list, tuple)):
-                for b in a:
-                    new_stats_list.append(b)
-            else:
-                new_stats_list.append(a)
-
-        rows = 0
-        row = 0
-        column_minus = 0
-        for i, image in enumerate(image_list):
-            if rows > 0 and rows % 4 == 0:
-                rows = 0
-                row += 2
-                column_minus = i
-
-            image = ImageTk.PhotoImage(image)
-            panel = Label(root, image=image)
-            panel.image = image
-            panel.grid(row=row, column=i - column_minus, sticky='w')
-
-            if i in [0, 1, 2, 11]:
-                text = Entry(root, textvariable=var[i], bg='orange')
-            elif new_stats_list[i] in [0, '0', '']:
-                text = Entry(root, textvariable=var[i], bg='red')
+    if stop is None:
+        stop = Event()
+
+    sources = []
+    if manifest is True:
+        for source, data_list in dls_manifest.reviewed_players():
+            all_data.append(data_list)
+            sources.append(source)
+
+    if triage is True and isinstance(data, list):
+        data = sorted(data, key=lambda x: triage_player(
+            x, review_fields(x)[1])[1])
+
+    done = object()
+    incoming = Queue(PREFETCH)
+    ready = []
+    state = {'current': None, 'images': None, 'finished': False,
+             'error': None, 'reviewed': 0, 'submitted': 0, 'accepted': 0}
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                incoming.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+
+        return False
+
+    def fetch():
+        '''
+        The screenshots are decoded and cropped here, the Tk thread only
+        makes the photos
+        '''
+        try:
+            for stats_list in data:
+                try:
+                    images = player_images(stats_list)
+                except Exception as e:
+                    # Moved, deleted or broken screenshot: the player is
+                    # left for a later run (dls_manifest)
+                    print(f'Skipped a card of {stats_list[0][0]}: {e!r}')
+                    dls_metrics.count('review_image_errors')
+                    continue
+
+                if put((stats_list, images)) is False:
+                    break
+        except Exception as e:
+            put(e)
+
+        put(done)
+        if hasattr(data, 'close'):
+            data.close()
+
+    root = Tk()
+    root.title('Data Checker')
+    root.resizable(width=False, height=False)
+    labels = []
+    entries = []
+    for i in range(REVIEW_FIELDS):
+        row = i // 4 * 2
+        label = Label(root)
+        label.grid(row=row, column=i % 4, sticky='w')
+        entry = Entry(root)
+        entry.grid(row=row + 1, column=i % 4, sticky='w')
+        labels.append(label)
+        entries.append(entry)
+
+    background = entries[0].cget('bg')
+    progress = Label(root, anchor='w')
+
+    def render():
+        '''
+        Convert the images of the fetched players, PREFETCH at most
+        '''
+        while len(ready) < PREFETCH and state['finished'] is False:
+            try:
+                item = incoming.get_nowait()
+            except Empty:
+                return
+
+            if item is done or isinstance(item, Exception):
+                state['finished'] = True
+                if item is not done:
+                    state['error'] = item
+
+                return
+
+            item, images = item
+            values = review_fields(item)[1]
+            doubtful, order = triage_player(item, values) \
+                if triage is True else (None, (0, 1))
+            if doubtful == []:
+                record(item, images, [str(x) for x in values] + ['', ''])
+                state['accepted'] += 1
+                continue
+
+            crops = review_fields(item, images)[0]
+            try:
+                photos = [ImageTk.PhotoImage(x) for x in crops]
+            except Exception as e:
+                print(f'Skipped a card of {item[0][0]}: {e!r}')
+                dls_metrics.count('review_image_errors')
+                continue
+
+            ready.append((order, item, images, values, photos, doubtful))
+
+    def show_progress():
+        text = f'{state["reviewed"]} reviewed, ' \
+            f'{state["submitted"]} submitted, ' \
+            f'{state["accepted"]} accepted, {len(ready)} ready'
+        if state['current'] is None:
+            text += ', waiting for OCR...'
+
+        progress.configure(text=text)
+
+    def show(stats_list: tuple, images: tuple, values: list, photos: list,
+             doubtful: list):
+        state['current'] = stats_list
+        state['images'] = images
+        for label, photo in zip(labels, photos):
+            label.configure(image=photo)
+            label.image = photo
+
+        for i, (entry, value) in enumerate(zip(entries, values)):
+            entry.delete(0, END)
+            entry.insert(0, value)
+            if doubtful is not None:
+                entry.configure(bg='red' if i in doubtful else background)
+            elif i in [0, 1, 2, 11]:
+                entry.configure(bg='orange')
+            elif value in [0, '0', '']:
+                entry.configure(bg='red')
             else:
-                text = Entry(root, textvariable=var[i])
+                entry.configure(bg=background)
+
+        entries[doubtful[0] if doubtful else 0].focus_set()
+
+    def next_player():
+        render()
+        if state['current'] is None and ready:
+            worst = min(range(len(ready)), key=lambda x: ready[x][0])
+            show(*ready.pop(worst)[1:])
+        elif state['current'] is None and state['finished'] is True:
+            root.quit()
+
+        show_progress()
+
+    def tick():
+        # Rescheduled whatever happens, or the window would wait forever
+        try:
+            next_player()
+        finally:
+            root.after(REVIEW_POLL, tick)
+
+    def record(stats_list: tuple, images: tuple, data_list: list = None):
+        source = stats_list[11] if len(stats_list) > 11 else None
+        if data_list is not None:
+            all_data.append(data_list)
+            dls_dedup.remember(images[0], images[1], data_list[0])
+            sources.append(source)
+
+        if manifest is True and source is not None:
+            dls_manifest.review(source, data_list)
+
+    def finish(data_list: list = None):
+        stats_list = state['current']
+        if stats_list is None:
+            return
+
+        images = state['images']
+        record(stats_list, images, data_list)
+        if data_list is not None:
+            # Accepted players aren't learned, their values come from OCR
+            learn_digits(images, data_list,
+                         dls_digits.layout_key(stats_list[0][2]))
+            state['submitted'] += 1
+
+        state['reviewed'] += 1
+        state['current'] = None
+        state['images'] = None
+        next_player()
+
+    def submit(event=None):
+        # The two unused fields keep the rows as long as before
+        finish([x.get() for x in entries] + ['', ''])
+        return 'break'
+
+    def skip(event=None):
+        finish()
+        return 'break'
+
+    def move(event, step: int):
+        i = entries.index(event.widget) if event.widget in entries else -1
+        entries[(i + step) % len(entries)].focus_set()
+        return 'break'
+
+    button = Button(root, text='Submit', default='active', command=submit)
+    button.grid(row=8, column=0, sticky='w')
+    button2 = Button(root, text='Skip', command=skip)
+    button2.grid(row=8, column=1, sticky='w')
+    progress.grid(row=8, column=2, columnspan=2, sticky='w')
+    root.bind('<Return>', submit)
+    root.bind('<KP_Enter>', submit)
+    root.bind('<Escape>', skip)
+    root.bind('<Down>', lambda event: move(event, 1))
+    root.bind('<Up>', lambda event: move(event, -1))
+    root.protocol('WM_DELETE_WINDOW', root.quit)
+
+    fetcher = Thread(target=fetch, daemon=True)
+    fetcher.start()
+    tick()
+    root.mainloop()
+    root.destroy()
+    stop.set()
+    fetcher.join()
+
+    dls_digits.save_templates()
+    dls_dedup.save_hashes()
+    with dls_metrics.timer('write'):
+        if wb is None:
+            store_player_data(all_data)
+        else:
+            write_player_data(all_data)
 
-            text.insert(0, new_stats_list[i])
-            text.grid(row=row + 1, column=i - column_minus, sticky='w')
-            rows += 1
+    dls_metrics.count('players_written', len(all_data))
+    dls_metrics.count('players_accepted', state['accepted'])
+    dls_metrics.count('players_reviewed', state['reviewed'])
+    if dls_metrics.ENABLED is True:
+        dls_metrics.export()
 
-        button = Button(root, text='Submit', default='active',
-                        command=callback)
-        button.grid(row=row + 2, column=0, sticky='w')
-        button2 = Button(root, text='Skip', command=root.destroy)
-        button2.grid(row=row + 2, column=1, sticky='w')
-        root.mainloop()
+    if manifest is True:
+        dls_manifest.written([x for x in sources if x is not None])
 
-    write_player_data(all_data)
+    if state['error'] is not None:
+        raise state['error']
 
 
 if __name__ == '__main__':
-    # Will rename all the image files (so that it won't be parsed next time)
-    # param "restore=True" will reset images' filenames
+    # Parsed screenshots are tracked by content hash in dls_manifest.sqlite,
+    # param "rename=True" renames them to _OLD instead
     empty_database = 'DLS 25 test database.xlsx'
     image_dir = 'dls25/winter'
 
-    wb = load_workbook(empty_database)
-    result = parse_image(image_dir,
-                         output=True)
+    # configure_reader(detector=False, threads=8, model_dir='models')
+    # Players are kept in dls_players.sqlite and exported to export_file at
+    # the end, edits made in export_file are read back on the next run. To
+    # write the workbook directly instead:
+    # from openpyxl import load_workbook; wb = load_workbook(empty_database)
+    export_file = 'DLS 25 export.xlsx'
+    if wb is None:
+        sync_store(export_file, empty_database)
+        # After a game update: dls_store.clear_updated()
+
+    result = iter_players(image_dir,
+                          output=True)
     check_gui(result)
+    if wb is None:
+        export_workbook(export_file, empty_database)
@@ -0,0 +1,102 @@
+from PIL import Image
+import numpy
+
+# Target glyph heights (px) of the single upscale after thresholding
+GLYPH_HEIGHT = 80
+GLYPH_HEIGHT_LARGE = 320
+MAX_SCALE = 24
+
+
+def to_array(image: Image.Image) -> numpy.ndarray:
+    '''
+    RGB pixels as an int16 array, so channel sums don't overflow
+    '''
+    return numpy.asarray(image.convert('RGB')).astype(numpy.int16)
+
+
+def mask_image(mask: numpy.ndarray) -> Image.Image:
+    '''
+    Boolean mask to a black and white image (True is white)
+    '''
+    return Image.fromarray(mask.astype(numpy.uint8) * 255, 'L')
+
+
+def red_mask(image: Image.Image) -> numpy.ndarray:
+    '''
+    Stat digits: red >= 150 and green + blue <= 100
+    '''
+    array = to_array(image)
+    return (array[..., 0] >= 150) & (array[..., 1] + array[..., 2] <= 100)
+
+
+def bright_mask(image: Image.Image) -> numpy.ndarray:
+    '''
+    Overall digits: channel sum >= 600
+    '''
+    return to_array(image).sum(axis=2) >= 600
+
+
+def glyph_rows(mask: numpy.ndarray) -> int:
+    '''
+    Height of the rows that contain foreground pixels
+    '''
+    rows = numpy.flatnonzero(mask.any(axis=1))
+    if len(rows) == 0:
+        return 0
+
+    return int(rows[-1] - rows[0] + 1)
+
+
+def scale(image: Image.Image, factor: float,
+          resample: int = Image.BILINEAR) -> Image.Image:
+    return image.resize((max(1, round(image.width * factor)),
+                         max(1, round(image.height * factor))),
+                        resample=resample)
+
+
+def upscale(image: Image.Image, mask: numpy.ndarray, height: int,
+            resample: int = Image.BILINEAR) -> Image.Image:
+    '''
+    Resize once so the glyphs in mask are `height` pixels tall
+    '''
+    rows = glyph_rows(mask) or image.height
+    factor = min(max(height / rows, 1), MAX_SCALE)
+    return scale(image, factor, resample)
+
+
+def red_variant(image: Image.Image, height: int,
+                resample: int) -> Image.Image:
+    mask = red_mask(image)
+    return upscale(mask_image(mask), mask, height, resample)
+
+
+def bright_variant(image: Image.Image) -> Image.Image:
+    return scale(mask_image(~bright_mask(image)), 6, Image.NEAREST)
+
+
+VARIANTS = {
+    'plain': lambda image: image,
+    'x2': lambda image: scale(image, 2),
+    'x4': lambda image: scale(image, 4),
+    'x6': lambda image: scale(image, 6, Image.NEAREST),
+    'red': lambda image: red_variant(image, GLYPH_HEIGHT, Image.BILINEAR),
+    'red_large': lambda image: red_variant(image, GLYPH_HEIGHT_LARGE,
+                                           Image.NEAREST),
+    'bright': bright_variant
+}
+# Variants tried in order until the OCR result is not empty
+LADDERS = {
+    'name': ('x2',),
+    'stat': ('plain', 'red', 'red_large'),
+    'overall': ('x6', 'bright'),
+    'position': ('x4', 'plain'),
+    'panel': ('plain',)
+}
+
+
+def preprocess(image: Image.Image, variant: str) -> Image.Image:
+    '''
+    Input: Crop of a card field, name of a VARIANTS entry
+    Output: Image to OCR
+    '''
+    return VARIANTS[variant](image)
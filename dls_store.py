@@ -0,0 +1,253 @@
+from threading import Lock
+from time import time
+import sqlite3
+
+STORE_FILE = 'dls_players.sqlite'
+SHEETS = ('Legendary Players', 'Rare Players', 'Common Players')
+# Workbook columns B:W (V is the =SUM formula, written on export)
+COLUMNS = ('first_name', 'last_name', 'price', 'nationality', 'club',
+           'position', 'foot', 'rating', 'height',
+           *[f'stat_{x}' for x in range(1, 11)],
+           'rating_change', None, 'player_id')
+CONNECTION: sqlite3.Connection = None
+# Lookups come from the OCR thread, writes from the review
+LOCK = Lock()
+
+
+def player_key(first_name, last_name) -> str:
+    '''
+    Normalized lookup key of a player name (workbook columns B and C)
+    '''
+    parts = [str(x) for x in (first_name, last_name) if x not in (None, '')]
+    return ' '.join(' '.join(parts).lower().split())
+
+
+def connect(filename: str = STORE_FILE) -> sqlite3.Connection:
+    global CONNECTION
+    if CONNECTION is None:
+        CONNECTION = sqlite3.connect(filename, timeout=30,
+                                     check_same_thread=False)
+        CONNECTION.row_factory = sqlite3.Row
+        columns = ', '.join(x for x in COLUMNS if x is not None)
+        # row orders the players of a sheet like the workbook rows
+        CONNECTION.execute('CREATE TABLE IF NOT EXISTS players '
+                           '(id INTEGER PRIMARY KEY, key TEXT, sheet TEXT, '
+                           f'row INTEGER, updated INTEGER, {columns})')
+        CONNECTION.execute('CREATE INDEX IF NOT EXISTS players_key '
+                           'ON players (key)')
+        CONNECTION.execute('CREATE INDEX IF NOT EXISTS players_sheet '
+                           'ON players (sheet, row)')
+        CONNECTION.execute('CREATE TABLE IF NOT EXISTS history '
+                           '(player INTEGER, rating INTEGER, time REAL)')
+        CONNECTION.execute('CREATE INDEX IF NOT EXISTS history_player '
+                           'ON history (player)')
+
+    return CONNECTION
+
+
+def close():
+    global CONNECTION
+    if CONNECTION is not None:
+        CONNECTION.close()
+        CONNECTION = None
+
+
+def is_empty() -> bool:
+    with LOCK:
+        return connect().execute(
+            'SELECT COUNT(*) FROM players').fetchone()[0] == 0
+
+
+def named_values(values: list) -> dict:
+    '''
+    Input: Values of the workbook columns B:W
+    Output: {store column: value}
+    '''
+    named = {name: x for x, name in zip(values, COLUMNS) if name is not None}
+    named['key'] = player_key(named['first_name'], named['last_name'])
+    return named
+
+
+def insert(connection: sqlite3.Connection, sheet: str, row: int,
+           updated: bool, values: list) -> int:
+    '''
+    Input: Sheet, order in the sheet, updated flag, values of the
+    workbook columns B:W
+    Output: Store id
+    '''
+    named = named_values(values)
+    named.update(sheet=sheet, row=row, updated=int(updated))
+    cursor = connection.execute(
+        f'INSERT INTO players ({", ".join(named)}) '
+        f'VALUES ({", ".join("?" * len(named))})', list(named.values()))
+    return cursor.lastrowid
+
+
+def update(connection: sqlite3.Connection, player_id: int, sheet: str,
+           row: int, updated: bool, values: list):
+    '''
+    Input: Store id, then the arguments of insert
+    '''
+    named = named_values(values)
+    named.update(sheet=sheet, row=row, updated=int(updated))
+    columns = ', '.join(f'{x} = ?' for x in named)
+    connection.execute(f'UPDATE players SET {columns} WHERE id = ?',
+                       [*named.values(), player_id])
+
+
+def import_workbook(filename: str):
+    '''
+    Update the stored players from the three player sheets of a workbook
+    in the write_player_data layout (data from row 4, green A cell for
+    updated players): hand edits and flags are taken, the n-th row of a
+    name is its n-th stored player. Players only in the store are kept
+    after the rows of their sheet, the rating history is kept and new
+    ratings are added to it.
+    '''
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(filename, read_only=True)
+    with LOCK:
+        connection = connect()
+        with connection:
+            stored = {}
+            for player in sorted(
+                    connection.execute('SELECT id, key, sheet, row, rating '
+                                       'FROM players').fetchall(),
+                    key=lambda x: (SHEETS.index(x['sheet']), x['row'])):
+                stored.setdefault(player['key'], []).append(player)
+
+            last = {}
+            for sheet in SHEETS:
+                last[sheet] = 3
+                rows = workbook[sheet].iter_rows(min_row=4, max_col=23)
+                for row, cells in enumerate(rows, start=4):
+                    values = [x.value for x in cells[1:]]
+                    values += [None] * (len(COLUMNS) - len(values))
+                    if values[:2] == [None, None]:
+                        continue
+
+                    rgb = cells[0].fill.fgColor.rgb
+                    updated = isinstance(rgb, str) and \
+                        rgb[2:].lower() == '00ff00'
+                    rating = values[COLUMNS.index('rating')]
+                    last[sheet] = row
+                    players = stored.get(named_values(values)['key'])
+                    if players:
+                        player = players.pop(0)
+                        update(connection, player['id'], sheet, row,
+                               updated, values)
+                        if str(player['rating']) == str(rating):
+                            continue
+
+                        player_id = player['id']
+                    else:
+                        player_id = insert(connection, sheet, row, updated,
+                                           values)
+
+                    connection.execute(
+                        'INSERT INTO history VALUES (?, ?, ?)',
+                        (player_id, rating, time()))
+
+            rest = sorted((x for players in stored.values() for x in players),
+                          key=lambda x: (SHEETS.index(x['sheet']), x['row']))
+            for player in rest:
+                last[player['sheet']] += 1
+                connection.execute('UPDATE players SET row = ? WHERE id = ?',
+                                   (last[player['sheet']], player['id']))
+
+    workbook.close()
+
+
+def clear_updated():
+    '''
+    Clear the updated flag of every player (after a game update: their
+    cards are read and written again)
+    '''
+    with LOCK:
+        connection = connect()
+        with connection:
+            connection.execute('UPDATE players SET updated = 0')
+
+
+def names() -> list[str]:
+    '''
+    Output: Names of the stored players, in sheet order
+    '''
+    with LOCK:
+        rows = connect().execute('SELECT first_name, last_name, sheet '
+                                 'FROM players ORDER BY row').fetchall()
+
+    rows = sorted(rows, key=lambda x: SHEETS.index(x['sheet']))
+    return [' '.join(str(x) for x in row[:2] if x not in (None, ''))
+            for row in rows]
+
+
+def find(player_name: str) -> dict:
+    '''
+    Output: Stored player (first one in sheet order), None if unknown
+    '''
+    with LOCK:
+        rows = connect().execute('SELECT * FROM players WHERE key = ?',
+                                 (player_key(None, player_name),)).fetchall()
+
+    if not rows:
+        return None
+
+    return dict(min(rows, key=lambda x: (SHEETS.index(x['sheet']),
+                                         x['row'])))
+
+
+def save(player: dict, sheet: str, values: list):
+    '''
+    Input: Player found before (None for a new one), its new sheet and
+    workbook values B:W
+    Update it in place (appended to the end of the sheet if it moves)
+    and record its rating
+    '''
+    with LOCK:
+        connection = connect()
+        with connection:
+            if player is not None and player['sheet'] == sheet:
+                row = player['row']
+            else:
+                row = connection.execute(
+                    'SELECT COALESCE(MAX(row), 3) + 1 FROM players '
+                    'WHERE sheet = ?', (sheet,)).fetchone()[0]
+
+            if player is None:
+                player_id = insert(connection, sheet, row, True, values)
+            else:
+                player_id = player['id']
+                update(connection, player_id, sheet, row, True, values)
+
+            connection.execute('INSERT INTO history VALUES (?, ?, ?)',
+                               (player_id, values[COLUMNS.index('rating')],
+                                time()))
+
+
+def sheet_rows(sheet: str) -> list[tuple]:
+    '''
+    Output: (updated, workbook values B:W) of a sheet, in order
+    '''
+    with LOCK:
+        rows = connect().execute('SELECT * FROM players WHERE sheet = ? '
+                                 'ORDER BY row', (sheet,)).fetchall()
+
+    return [(bool(x['updated']),
+             [None if name is None else x[name] for name in COLUMNS])
+            for x in rows]
+
+
+def rating_history(player_name: str) -> list[tuple]:
+    '''
+    Output: (rating, time) of the ratings saved for a player
+    '''
+    player = find(player_name)
+    if player is None:
+        return []
+
+    with LOCK:
+        return [tuple(x) for x in connect().execute(
+            'SELECT rating, time FROM history WHERE player = ? '
+            'ORDER BY time', (player['id'],))]
@@ -0,0 +1,154 @@
+import json
+import os
+import random
+
+from PIL import Image, ImageDraw, ImageFont
+
+from dls_player_data import DEVICE
+from dls_triage import POSITIONS
+
+TRUTH_FILE = 'truth.json'
+# Colors scan_coords and get_layout look for
+BACKGROUND = (24, 24, 24)
+CARD = (98, 98, 98)
+NAME_BAR = (133, 133, 133)
+PANEL = (55, 55, 55)
+TILE = (40, 40, 40)
+STAT = (220, 40, 40)
+OVERALL = (40, 221, 25)
+POSITION = (255, 88, 120)
+TEXT = (255, 255, 255)
+SYLLABLES = ('ma', 'ri', 'lo', 'ne', 'ta', 'vi', 'ni', 'ca', 'ro', 'se',
+             'an', 'el', 'ju', 'pe', 'do', 'ra', 'li', 'to', 'ga', 'be')
+LEGS = {'L': 'Left', 'R': 'Right', 'B': 'Both'}
+
+
+def random_player(rnd: random.Random) -> dict:
+    '''
+    Output: Ground truth of a card, values in check_gui order
+    '''
+    def word():
+        return ''.join(rnd.choice(SYLLABLES)
+                       for _ in range(rnd.randint(2, 4))).title()
+
+    overall = rnd.randint(60, 90)
+    return {'name': f'{word()} {word()}', 'overall': overall,
+            'position': rnd.choice(POSITIONS),
+            'stats': [rnd.randint(30, 99) for _ in range(8)],
+            'height': rnd.randint(165, 205), 'leg': rnd.choice('LRB'),
+            'price': int(680 * 1.095 ** (overall - 70) *
+                         rnd.uniform(0.85, 1.15)),
+            'secret': False}
+
+
+def draw_card(draw: ImageDraw.ImageDraw, x: int, y: int, device_dict: dict,
+              player: dict):
+    width, height = device_dict['card_width'], device_dict['card_height']
+    name_height = device_dict['name'][3]
+    size = device_dict['stats_size']
+    font = ImageFont.load_default(size=max(10, name_height // 2))
+
+    # Secret players keep the card frame, their values are hidden
+    def value(x):
+        return '?' if player['secret'] is True else str(x)
+
+    draw.rectangle((x, y, x + width - 1, y + height - 1), fill=CARD)
+    draw.rectangle((x, y, x + width - 1, y + name_height - 1), fill=NAME_BAR)
+    draw.text((x + 10, y + 5),
+              'Secret Player' if player['secret'] else player['name'],
+              fill=TEXT, font=font)
+    sx, sy = device_dict['stats_topleft_coords']
+    for i, stat in enumerate(player['stats']):
+        tx = x + sx + i % 4 * (size + device_dict['stats_width_space'])
+        ty = y + sy + i // 4 * (size + device_dict['stats_height_space'])
+        draw.rectangle((tx, ty, tx + size - 1, ty + size - 1), fill=TILE,
+                       outline=(0, 0, 0), width=2)
+        draw.text((tx + size // 8, ty + size // 6), value(stat), fill=STAT,
+                  font=font)
+
+    ox, oy = device_dict['overall'][:2]
+    badge = int(size * .7) + 1
+    draw.rectangle((x + ox, y + oy, x + ox + badge, y + oy + badge),
+                   fill=OVERALL)
+    draw.text((x + ox + 3, y + oy + 3), value(player['overall']), fill=TEXT,
+              font=font)
+    px0, py0, px1, py1 = device_dict['position']
+    draw.rectangle((x + px0, y + py0, x + px1, y + py1), fill=POSITION)
+    draw.text((x + px0 + 2, y + py0 + 1), value(player['position']),
+              fill=TEXT, font=ImageFont.load_default(size=max(6, py1 - py0 -
+                                                             2)))
+
+    panel = device_dict['panel'][1]
+    draw.rectangle((x, y + panel - 11, x + width - 1, y + panel - 11),
+                   fill=PANEL)
+    draw.rectangle((x, y + panel, x + width - 1, y + height - 1), fill=PANEL)
+    for field, text in (('height', f'{player["height"]}cm'),
+                        ('leg', LEGS[player['leg']]),
+                        ('price', f'{player["price"]:,}')):
+        box = device_dict[field]
+        draw.text((x + box[0], y + panel + 4), value(text), fill=TEXT,
+                  font=font)
+
+
+def render(size: str, seed: int = 0, jitter: int = 0, secret: float = 0.1,
+           grid: tuple[int] = None) -> tuple[Image.Image, dict, list[dict]]:
+    '''
+    Input: DEVICE key, random seed, maximum grid offset in pixels,
+    fraction of secret player cards, (columns, rows) of cards (default
+    the DEVICE cards_count)
+    Output: Landscape transfer market screenshot, its layout and the
+    ground truth of its cards (column by column, like card_boxes)
+    '''
+    rnd = random.Random(seed)
+    device_dict = dict(DEVICE[size])
+    x0, y0 = device_dict['topleft_coords']
+    if jitter:
+        x0 += rnd.randint(-jitter, jitter)
+        y0 += rnd.randint(-jitter, jitter)
+
+    device_dict['topleft_coords'] = (x0, y0)
+    if grid is not None:
+        device_dict['cards_count'] = tuple(grid)
+
+    width, height = sorted(map(int, size.split('x')), reverse=True)
+    image = Image.new('RGB', (width, height), BACKGROUND)
+    draw = ImageDraw.Draw(image)
+    columns, rows = device_dict['cards_count']
+    players = []
+    for i in range(columns):
+        for j in range(rows):
+            player = random_player(rnd)
+            player['secret'] = rnd.random() < secret
+            draw_card(draw, x0 + i * (device_dict['card_width'] +
+                                      device_dict['width_space']),
+                      y0 + j * (device_dict['card_height'] +
+                                device_dict['height_space']),
+                      device_dict, player)
+            players.append(player)
+
+    return image, device_dict, players
+
+
+def generate(directory: str, count: int, sizes: tuple = tuple(DEVICE),
+             seed: int = 0, **kwargs) -> dict:
+    '''
+    Input: Output directory, number of screenshots (spread over sizes),
+    seed, render options
+    Output: {filename: {'size', 'layout', 'players'}}, also written to
+    TRUTH_FILE in the directory
+    '''
+    os.makedirs(directory, exist_ok=True)
+    truth = {}
+    for index in range(count):
+        size = sizes[index % len(sizes)]
+        image, device_dict, players = render(size, seed * 100003 + index,
+                                             **kwargs)
+        filename = f'{size}_{index:04d}.png'
+        image.save(os.path.join(directory, filename))
+        truth[filename] = {'size': size, 'layout': device_dict,
+                           'players': players}
+
+    with open(os.path.join(directory, TRUTH_FILE), 'w') as f:
+        json.dump(truth, f, indent=1)
+
+    return truth
@@ -0,0 +1,77 @@
+MIN_CONFIDENCE = 0.7
+# Values seen in the DLS 25 database
+POSITIONS = ('GK', 'CB', 'LB', 'RB', 'LWB', 'RWB', 'DM', 'CM', 'AM', 'LM',
+             'RM', 'LW', 'RW', 'SS', 'CF')
+LEGS = ('L', 'R', 'B')
+RANGES = {'overall': (40, 99), 'stat': (10, 99), 'height': (150, 215)}
+# Median price at PRICE_BASE[0] rating, it grows by PRICE_GROWTH per point.
+# Only checked from that rating up, lower ones have no reference prices.
+PRICE_BASE = (70, 680)
+PRICE_GROWTH = 1.095
+PRICE_TOLERANCE = (0.75, 1.3)
+# check_gui field order
+FIELDS = ('name', 'overall', 'position',
+          *[f'stat_{x}' for x in range(1, 9)], 'height', 'leg', 'price')
+
+
+def price_range(rating: int) -> tuple[float, float]:
+    '''
+    Output: Plausible price range of a rating, None below PRICE_BASE
+    '''
+    if rating < PRICE_BASE[0]:
+        return None
+
+    price = PRICE_BASE[1] * PRICE_GROWTH ** (rating - PRICE_BASE[0])
+    return price * PRICE_TOLERANCE[0], price * PRICE_TOLERANCE[1]
+
+
+def in_range(value, low: int, high: int) -> bool:
+    try:
+        return low <= int(value) <= high
+    except Exception:
+        return False
+
+
+def doubtful_fields(values: list, confidences: list) -> list[int]:
+    '''
+    Input: Field values and confidences in check_gui order
+    Output: Indexes of the fields that need a human look: low confidence
+    or failed range, vocabulary or price checks
+    '''
+    doubtful = {i for i, confidence in enumerate(confidences)
+                if confidence < MIN_CONFIDENCE}
+    if not str(values[0]).strip():
+        doubtful.add(0)
+
+    if not in_range(values[1], *RANGES['overall']):
+        doubtful.add(1)
+
+    if values[2] not in POSITIONS:
+        doubtful.add(2)
+
+    for i in range(3, 11):
+        if not in_range(values[i], *RANGES['stat']):
+            doubtful.add(i)
+
+    if not in_range(values[11], *RANGES['height']):
+        doubtful.add(11)
+
+    if values[12] not in LEGS:
+        doubtful.add(12)
+
+    if 1 not in doubtful:
+        bounds = price_range(int(values[1]))
+        if bounds is not None and not in_range(values[13], *bounds):
+            doubtful.add(13)
+
+    if not in_range(values[13], 1, 10 ** 6):
+        doubtful.add(13)
+
+    return sorted(doubtful)
+
+
+def review_order(values: list, confidences: list) -> tuple:
+    '''
+    Sort key, worst first: most doubtful fields, then lowest confidence
+    '''
+    return -len(doubtful_fields(values, confidences)), min(confidences)
@@ -0,0 +1,150 @@
+import os
+
+from PIL import Image, ImageSequence
+import numpy
+
+import dls_player_data
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.webp')
+ANIMATED_EXTENSIONS = ('.gif', '.png', '.apng', '.webp')
+# Frame rate of a folder of frames
+FRAME_RATE = 30
+# Width of the grayscale thumbnails that are compared, and the gray
+# difference of a thumbnail pixel that counts as changed
+THUMB_WIDTH = 320
+PIXEL = 32
+# Changed pixels (fraction) a screen may have and still be the same one
+# (scrolling changes most of them, new card text a few)
+STILL = 0.001
+# Seconds the screen has to stay still to be kept
+SETTLE = 0.3
+# Changed pixels (fraction) from the last kept frame that make a new
+# screen, a scroll back to it is skipped
+CHANGE = 0.0002
+
+
+def frames(source: str):
+    '''
+    Input: Folder of frames (sorted by name, FRAME_RATE), animated
+    PNG/GIF, or a video (needs opencv-python)
+    Output: (end of the frame in seconds, RGB frame), one at a time
+    '''
+    if os.path.isdir(source):
+        filenames = [x for x in sorted(os.listdir(source))
+                     if x.lower().endswith(IMAGE_EXTENSIONS)]
+        for index, filename in enumerate(filenames):
+            with Image.open(os.path.join(source, filename)) as image:
+                yield (index + 1) / FRAME_RATE, image.convert('RGB')
+
+        return
+
+    if source.lower().endswith(ANIMATED_EXTENSIONS):
+        seconds = 0
+        with Image.open(source) as image:
+            # Identical frames are saved once, with a longer duration
+            for frame in ImageSequence.Iterator(image):
+                seconds += frame.info.get('duration', 1000 / FRAME_RATE) \
+                    / 1000
+                yield seconds, frame.convert('RGB')
+
+        return
+
+    import cv2
+
+    capture = cv2.VideoCapture(source)
+    try:
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+
+            # Position of the next frame, the end of this one
+            yield capture.get(cv2.CAP_PROP_POS_MSEC) / 1000, \
+                Image.fromarray(frame[..., ::-1])
+    finally:
+        capture.release()
+
+
+def thumbnail(image: Image.Image) -> numpy.ndarray:
+    height = max(1, round(THUMB_WIDTH * image.height / image.width))
+    return numpy.asarray(image.convert('L').resize(
+        (THUMB_WIDTH, height), resample=Image.BILINEAR), dtype=numpy.int16)
+
+
+def changed(a: numpy.ndarray, b: numpy.ndarray) -> float:
+    '''
+    Output: Fraction of the thumbnail pixels that changed (1 for
+    different sizes)
+    '''
+    if a.shape != b.shape:
+        return 1.0
+
+    return float((numpy.abs(a - b) > PIXEL).mean())
+
+
+def keyframes(source: str):
+    '''
+    Output: (frame index, frame) of the screens the scrolling stopped
+    on: still for SETTLE seconds, CHANGE away from the last kept one,
+    with a card grid get_layout finds
+    '''
+    kept = None
+    # (index, frame, thumbnail, start in seconds) of the current screen
+    screen = None
+    last = 0
+
+    def settled():
+        index, frame, thumb, start = screen
+        return last - start >= SETTLE and \
+            (kept is None or changed(thumb, kept) >= CHANGE) and \
+            dls_player_data.get_layout(frame)
+
+    for index, (seconds, frame) in enumerate(frames(source)):
+        thumb = thumbnail(frame)
+        if screen is not None and changed(thumb, screen[2]) < STILL:
+            last = seconds
+            continue
+
+        if screen is not None and settled():
+            kept = screen[2]
+            yield screen[:2]
+
+        screen = (index, frame, thumb, last)
+        last = seconds
+
+    if screen is not None and settled():
+        yield screen[:2]
+
+
+def frames_directory(source: str) -> str:
+    return f'{os.path.splitext(source.rstrip(os.sep))[0]}_frames'
+
+
+def extract(source: str, directory: str = None) -> list[str]:
+    '''
+    Input: Recording, output folder (default <recording>_frames)
+    Output: Files of the kept frames, ready for the screenshot pipeline
+    '''
+    if directory is None:
+        directory = frames_directory(source)
+
+    os.makedirs(directory, exist_ok=True)
+    filenames = []
+    for index, frame in keyframes(source):
+        filename = os.path.join(directory, f'frame_{index:06d}.png')
+        frame.save(filename)
+        filenames.append(filename)
+
+    return filenames
+
+
+def iter_recording(source: str, directory: str = None, **kwargs):
+    '''
+    extract the recording, then iter_players over its frames (keyword
+    arguments are passed on)
+    '''
+    if directory is None:
+        directory = frames_directory(source)
+
+    extract(source, directory)
+    yield from dls_player_data.iter_players(directory, **kwargs)
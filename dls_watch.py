@@ -0,0 +1,121 @@
+from threading import Event
+from time import monotonic
+import os
+
+from PIL import Image
+
+import dls_player_data
+
+# Seconds between two scans of the folder
+POLL = 0.5
+# Seconds the size and modification time of a file have to stay the same
+# before it is read (AirDrop and sync clients write in chunks)
+STABLE = 1.0
+
+
+def scan(image_dir: str) -> dict[str, tuple[int, int]]:
+    '''
+    Output: {filename: (size, modification time)} of the files
+    list_images would consider
+    '''
+    files = {}
+    with os.scandir(image_dir) as entries:
+        for entry in entries:
+            if '.' not in entry.name or entry.name[0] == '.' or \
+                    os.path.splitext(entry.name)[0].endswith('_OLD'):
+                continue
+
+            try:
+                if entry.is_file():
+                    stat = entry.stat()
+                    files[entry.path] = (stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                continue
+
+    return files
+
+
+def complete(filename: str) -> bool:
+    '''
+    Output: True if the whole image decodes (a file still being written
+    is cut short)
+    '''
+    try:
+        with Image.open(filename) as image:
+            image.load()
+
+        return True
+    except Exception:
+        return False
+
+
+def watch(image_dir: str, existing: bool = True, stop: Event = None,
+          poll: float = POLL, stable: float = STABLE):
+    '''
+    Input: Screenshot folder, existing=False skips the files already in
+    it, stop ends the watch when set
+    Output: Screenshots, one at a time, as soon as they are fully
+    written (unchanged for `stable` seconds and decodable). Files are
+    sorted by name within a scan.
+    '''
+    if stop is None:
+        stop = Event()
+
+    done = set() if existing is True else set(scan(image_dir))
+    # {filename: ((size, modification time), first seen with them)}
+    changing = {}
+    while not stop.is_set():
+        now = monotonic()
+        files = scan(image_dir)
+        for filename, stat in sorted(files.items()):
+            if filename in done:
+                continue
+
+            seen = changing.get(filename)
+            if seen is None or seen[0] != stat:
+                changing[filename] = (stat, now)
+            elif now - seen[1] >= stable and complete(filename):
+                del changing[filename]
+                done.add(filename)
+                yield filename
+
+        for filename in set(changing) - set(files):
+            del changing[filename]
+
+        stop.wait(poll)
+
+
+def run(image_dir: str, existing: bool = True, **kwargs):
+    '''
+    Watch mode: one process keeps the reader, the roster index and the
+    learned templates warm and parses every screenshot that lands in the
+    folder, the review window stays open and shows the new players as
+    they are read. Closing it writes the reviewed players.
+    Keyword arguments are passed to generate_players (workers and
+    window are fixed to 1: every screenshot is parsed as it arrives).
+    '''
+    stop = Event()
+    kwargs.update(workers=1, window=1)
+    # Loaded once, before the first screenshot arrives
+    dls_player_data.get_reader()
+    dls_player_data.resolve_name('')
+    players = dls_player_data.iter_players(
+        image_dir, filenames=watch(image_dir, existing, stop), **kwargs)
+    # Closing the window also ends the watch at its next scan (players
+    # still queued for review are replayed from dls_manifest next time)
+    dls_player_data.check_gui(players, stop=stop)
+
+
+if __name__ == '__main__':
+    # Screenshots AirDropped or synced into the folder during a session
+    image_dir = 'dls25/winter'
+    empty_database = 'DLS 25 test database.xlsx'
+    export_file = 'DLS 25 export.xlsx'
+
+    # dls_player_data.configure_reader(detector=False, threads=8)
+    if dls_player_data.wb is None:
+        dls_player_data.sync_store(export_file, empty_database)
+
+    run(image_dir, output=True)
+    if dls_player_data.wb is None:
+        dls_player_data.export_workbook(export_file, empty_database)
@@ -0,0 +1,151 @@
+import os
+import random
+import sys
+
+from PIL import Image, ImageDraw
+import numpy
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import dls_cache  # noqa: E402
+import dls_manifest  # noqa: E402
+import dls_player_data  # noqa: E402
+import dls_store  # noqa: E402
+import dls_synth  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def work_dir(tmp_path, monkeypatch):
+    '''
+    The modules keep their files (cache, manifest, hashes...) in the
+    working directory, their connections are closed after the test
+    '''
+    monkeypatch.chdir(tmp_path)
+    yield tmp_path
+    for module in (dls_cache, dls_manifest, dls_store):
+        module.close()
+
+
+@pytest.fixture
+def values():
+    '''
+    Parsed player values (everything after the card reference)
+    '''
+    return (('', ''), 'Luka Modric', 84, 'CM',
+            [70, 80, 75, 88, 79, 90, 82, 71], 172, 'R', 2900, 'Time: 0.1s',
+            [0.9] * 14)
+
+
+@pytest.fixture
+def screenshot():
+    '''
+    Output: screenshot(directory, seed) -> (file of a synthetic market
+    screenshot, its layout)
+    '''
+    def save(directory: str, seed: int = 0) -> tuple[str, dict]:
+        os.makedirs(directory, exist_ok=True)
+        image, device_dict, _ = dls_synth.render('828x1792', seed, secret=0)
+        filename = os.path.join(directory, f'{seed}.png')
+        image.save(filename)
+        return filename, device_dict
+
+    return save
+
+
+@pytest.fixture
+def checkpointed(screenshot, values):
+    '''
+    Output: checkpointed(directory, seeds) -> directory of screenshots
+    already parsed (dls_manifest), replayed without OCR
+    '''
+    def save(directory: str, seeds=(0,)) -> str:
+        for seed in seeds:
+            filename, device_dict = screenshot(directory, seed)
+            dls_manifest.checkpoint(
+                dls_manifest.file_key(filename), filename,
+                [(i, box, device_dict, values) for i, box
+                 in enumerate(dls_player_data.card_boxes(device_dict))])
+
+        return directory
+
+    return save
+
+
+@pytest.fixture
+def player():
+    return dls_synth.random_player(random.Random(7))
+
+
+@pytest.fixture
+def render_card():
+    '''
+    Output: render(player, size, dx, dy) -> (card resampled to CARD_SIZE,
+    card layout), dx/dy move the crop box off the card
+    '''
+    def render(player: dict, size: str = '828x1792', dx: int = 0,
+               dy: int = 0):
+        device_dict = dict(dls_player_data.DEVICE[size])
+        width = device_dict['card_width']
+        height = device_dict['card_height']
+        image = Image.new('RGB', (width + 20, height + 20),
+                          dls_synth.BACKGROUND)
+        dls_synth.draw_card(ImageDraw.Draw(image), 10, 10, device_dict,
+                            player)
+        card = dls_player_data.crop_card(
+            image, (10 + dx, 10 + dy, 10 + dx + width, 10 + dy + height))
+        return card, dls_player_data.card_layout(device_dict)
+
+    return render
+
+
+class StubReader:
+    '''
+    easyocr stand-in answering from {crop pixels: text}, a list of texts
+    is one detection per text. Crops it has no answer for read nothing.
+    '''
+    def __init__(self):
+        self.answers = {}
+        self.calls = []
+
+    def add(self, image: Image.Image, text):
+        self.answers[image.convert('RGB').tobytes()] = text
+
+    def answer(self, array) -> list:
+        text = self.answers.get(
+            Image.fromarray(numpy.ascontiguousarray(array))
+            .convert('RGB').tobytes(), [])
+        return [text] if isinstance(text, str) else text
+
+    def recognize(self, image, horizontal_list, free_list, allowlist,
+                  detail, batch_size):
+        self.calls.append(('recognize', allowlist, len(horizontal_list)))
+        result = []
+        for x0, x1, y0, y1 in horizontal_list:
+            for text in self.answer(image[y0:y1, x0:x1]):
+                result.append(([[x0, y0], [x1, y0], [x1, y1], [x0, y1]],
+                               text, 0.9))
+
+        # Not in canvas order: the texts are found back by their box
+        return result[::-1]
+
+    def readtext_batched(self, arrays, allowlist, detail, batch_size):
+        self.calls.append(('readtext_batched', allowlist, len(arrays)))
+        return [[([[0, 0]] * 4, text, 0.8) for text in self.answer(x)]
+                for x in arrays]
+
+
+@pytest.fixture
+def reader(monkeypatch):
+    '''
+    Output: reader(detector) -> StubReader used by dls_player_data
+    '''
+    def install(detector: bool = False) -> StubReader:
+        stub = StubReader()
+        monkeypatch.setitem(dls_player_data.READER_CONFIG, 'detector',
+                            detector)
+        monkeypatch.setattr(dls_player_data, 'READER', stub)
+        return stub
+
+    return install
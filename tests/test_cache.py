@@ -0,0 +1,44 @@
+from PIL import Image
+
+import dls_cache
+
+
+def crop(value: int) -> Image.Image:
+    return Image.new('L', (40, 20), value)
+
+
+def test_key_covers_pixels_and_reading():
+    key = dls_cache.crop_key(crop(0), 'plain', '0123456789', False)
+    assert key == dls_cache.crop_key(crop(0), 'plain', '0123456789', False)
+    assert len({key,
+                dls_cache.crop_key(crop(1), 'plain', '0123456789', False),
+                dls_cache.crop_key(crop(0), 'x2', '0123456789', False),
+                dls_cache.crop_key(crop(0), 'plain', None, False),
+                dls_cache.crop_key(crop(0), 'plain', '0123456789',
+                                   True)}) == 5
+
+
+def test_results_persist_across_connections():
+    dls_cache.put_many({'a': ['87', 0.98], 'b': ['Kane', 0.91]})
+    dls_cache.close()
+    stats = dict(dls_cache.STATS)
+    assert dls_cache.get_many(['a', 'b', 'c']) == {'a': ['87', 0.98],
+                                                   'b': ['Kane', 0.91]}
+    assert dls_cache.STATS['hits'] - stats['hits'] == 2
+    assert dls_cache.STATS['misses'] - stats['misses'] == 1
+
+
+def test_least_recently_used_are_evicted(monkeypatch):
+    monkeypatch.setattr(dls_cache, 'MAX_ENTRIES', 3)
+    now = [0.0]
+    monkeypatch.setattr(dls_cache, 'time', lambda: now[0])
+    for key in 'abc':
+        now[0] += 1
+        dls_cache.put_many({key: [key, 1.0]})
+
+    # Reading a refreshes it, b is now the oldest
+    now[0] += 1
+    dls_cache.get_many(['a'])
+    now[0] += 1
+    dls_cache.put_many({'d': ['d', 1.0]})
+    assert set(dls_cache.get_many(list('abcd'))) == {'a', 'c', 'd'}
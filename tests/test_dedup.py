@@ -0,0 +1,56 @@
+import random
+
+import dls_dedup
+import dls_synth
+
+
+def changed(player: dict) -> dict:
+    # A game update: overall, every stat and the price move
+    return dict(player, overall=player['overall'] + 2,
+                stats=[x + 3 for x in player['stats']],
+                price=int(player['price'] * 1.2))
+
+
+def hashed(render_card, player: dict) -> tuple:
+    card, layout = render_card(player)
+    return card, card.crop(layout['name'])
+
+
+def test_same_card_is_dropped_in_the_run(render_card, player):
+    dls_dedup.load_hashes()
+    assert dls_dedup.check(*hashed(render_card, player)) is False
+    assert dls_dedup.check(*hashed(render_card, player)) is True
+
+
+def test_written_card_is_dropped_while_updated(render_card, player):
+    dls_dedup.load_hashes()
+    dls_dedup.remember(*hashed(render_card, player), player['name'])
+    dls_dedup.save_hashes()
+
+    dls_dedup.load_hashes(lambda x: x == player['name'])
+    assert dls_dedup.check(*hashed(render_card, player)) is True
+
+
+def test_changed_rating_card_is_read_after_flags_reset(render_card,
+                                                        player):
+    dls_dedup.load_hashes()
+    dls_dedup.remember(*hashed(render_card, player), player['name'])
+    dls_dedup.save_hashes()
+
+    # The green update flags were cleared for the new game update
+    dls_dedup.load_hashes(lambda x: False)
+    assert dls_dedup.check(*hashed(render_card, changed(player))) is False
+    assert dls_dedup.NAMES == []
+
+
+def test_flags_are_per_player(render_card, player):
+    dls_dedup.load_hashes()
+    dls_dedup.remember(*hashed(render_card, player), player['name'])
+    other = dls_synth.random_player(random.Random(8))
+    dls_dedup.remember(*hashed(render_card, other), other['name'])
+    dls_dedup.save_hashes()
+
+    dls_dedup.load_hashes(lambda x: x == other['name'])
+    assert dls_dedup.NAMES == [other['name']]
+    assert dls_dedup.check(*hashed(render_card, player)) is False
+    assert dls_dedup.check(*hashed(render_card, other)) is True
@@ -0,0 +1,45 @@
+from PIL import Image, ImageDraw, ImageFont
+import pytest
+
+import dls_digits
+
+KEY = '100x120'
+
+
+def field(text: str) -> Image.Image:
+    image = Image.new('RGB', (24 * len(text) + 20, 40), (235, 235, 235))
+    ImageDraw.Draw(image).text((10, 6), text, fill=(20, 20, 20),
+                               font=ImageFont.load_default(size=24))
+    return image
+
+
+@pytest.fixture(autouse=True)
+def templates():
+    dls_digits.load_templates()
+    yield
+    dls_digits.load_templates()
+
+
+def test_layout_missing_a_digit_is_not_read():
+    assert dls_digits.learn(field('1234567'), '1234567', KEY)
+    assert KEY not in dls_digits.COMPLETE
+    # Without templates of 8 and 9 a 9 would be read as its nearest digit
+    assert dls_digits.read_digits(field('9'), KEY) == ('', 0.0)
+    assert dls_digits.read_digits(field('57'), KEY) == ('', 0.0)
+
+
+def test_complete_layout_is_read():
+    assert dls_digits.learn(field('1234567'), '1234567', KEY)
+    assert dls_digits.learn(field('890'), '890', KEY)
+    assert KEY in dls_digits.COMPLETE
+    text, confidence = dls_digits.read_digits(field('9075'), KEY)
+    assert text == '9075'
+    assert confidence >= dls_digits.THRESHOLD
+
+
+def test_complete_layout_is_loaded():
+    dls_digits.learn(field('0123456789'), '0123456789', KEY)
+    dls_digits.learn(field('12'), '12', '200x240')
+    dls_digits.save_templates()
+    dls_digits.load_templates()
+    assert dls_digits.COMPLETE == {KEY}
@@ -0,0 +1,64 @@
+import random
+
+import pytest
+
+import dls_fuzzy
+
+ROSTER = ['Harry Kane', 'Luis Suarez', 'Luis Diaz', 'Vini Jr.',
+          'Kevin De Bruyne', 'Wissam Ben Yedder', 'Ivan Balliu', 'Pedro',
+          'Kane']
+
+
+def levenshtein(a: str, b: str) -> int:
+    row = list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        previous, row[0] = row[0], i
+        for j, y in enumerate(b, 1):
+            previous, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1,
+                                           previous + (x != y))
+
+    return row[-1]
+
+
+@pytest.fixture
+def roster():
+    dls_fuzzy.build(ROSTER)
+    yield
+    dls_fuzzy.clear()
+
+
+def test_normalize():
+    assert dls_fuzzy.normalize('Vini Jr.') == 'vinijr'
+    assert dls_fuzzy.normalize('Vinijr。') == 'vinijr'
+    assert dls_fuzzy.normalize('Ｋａｎｅ') == 'kane'
+
+
+def test_distance_matches_levenshtein():
+    rng = random.Random(0)
+    for _ in range(2000):
+        a = ''.join(rng.choices('abcde', k=rng.randrange(0, 90)))
+        b = ''.join(rng.choices('abcde', k=rng.randrange(0, 90)))
+        assert dls_fuzzy.distance(a, b) == levenshtein(a, b)
+
+
+def test_lookup(roster):
+    assert dls_fuzzy.lookup('HARRY KANE') == ('Harry Kane', False)
+    assert dls_fuzzy.lookup('Vinijr。') == ('Vini Jr.', False)
+    # OCR slips
+    assert dls_fuzzy.lookup('Kevin De Bruyme') == ('Kevin De Bruyne', False)
+    assert dls_fuzzy.lookup('Wissam Ben Yeder') == ('Wissam Ben Yedder',
+                                                    False)
+    # A new player is kept as read
+    assert dls_fuzzy.lookup('Erling Haaland') == ('Erling Haaland', False)
+
+
+def test_ambiguous_lookup_is_flagged(roster):
+    assert dls_fuzzy.lookup('Luis Diarez') == ('Luis Diarez', True)
+
+
+def test_short_near_matches_are_reviewed(roster):
+    # Different players, one edit apart
+    assert dls_fuzzy.lookup('Pedri') == ('Pedri', True)
+    assert dls_fuzzy.lookup('Kante') == ('Kante', True)
+    # Two edits on a long name
+    assert dls_fuzzy.lookup('Kevin Da Bruyme') == ('Kevin Da Bruyme', True)
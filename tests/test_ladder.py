@@ -0,0 +1,84 @@
+import pytest
+
+import dls_ladder
+
+KEY = '360x480'
+
+
+@pytest.fixture(autouse=True)
+def stats():
+    dls_ladder.load_stats()
+    yield
+    dls_ladder.load_stats()
+
+
+def record(variant: str, tries: int, wins: int, key: str = KEY):
+    for i in range(tries):
+        dls_ladder.record(key, 'stat', variant, i < wins)
+
+
+def test_untried_layout_keeps_the_default_order():
+    assert dls_ladder.ladder(KEY, 'stat') == ('plain', 'red', 'red_large')
+
+
+def test_best_rung_first_and_dead_rungs_dropped():
+    record('plain', dls_ladder.MIN_TRIES, 0)
+    record('red', 10, 2)
+    record('red_large', 10, 9)
+    assert dls_ladder.ladder(KEY, 'stat') == ('red_large', 'red')
+    # Other layouts learn their own order
+    assert dls_ladder.ladder('100x120', 'stat') == ('plain', 'red',
+                                                    'red_large')
+
+
+def test_ladder_without_wins_is_not_narrowed():
+    for variant in ('plain', 'red', 'red_large'):
+        record(variant, dls_ladder.MIN_TRIES, 0)
+
+    assert len(dls_ladder.ladder(KEY, 'stat')) == 3
+
+
+def test_dropped_rungs_are_probed_again():
+    record('plain', dls_ladder.MIN_TRIES, 0)
+    record('red', 10, 5)
+    ladders = [dls_ladder.ladder(KEY, 'stat')
+               for _ in range(dls_ladder.PROBE)]
+    assert ladders.count(('red', 'red_large')) == dls_ladder.PROBE - 1
+    assert ladders[-1] == ('red', 'red_large', 'plain')
+    # A rung that reads again comes back
+    record('plain', 40, 38)
+    assert dls_ladder.ladder(KEY, 'stat')[0] == 'plain'
+
+
+def test_old_counts_decay():
+    record('red', dls_ladder.MAX_TRIES - 1, 0)
+    record('red', 1, 1)
+    assert dls_ladder.STATS[KEY]['stat']['red'] == \
+        [dls_ladder.MAX_TRIES // 2, 0]
+
+
+def test_run_without_wins_is_not_saved():
+    record('red', 10, 4)
+    dls_ladder.save_stats()
+    dls_ladder.load_stats()
+    # The reader failed on every crop of this run
+    for variant in ('plain', 'red', 'red_large'):
+        record(variant, dls_ladder.MIN_TRIES, 0)
+
+    # Other ladders of the run are saved
+    dls_ladder.record(KEY, 'name', 'x2', True)
+    dls_ladder.save_stats()
+    dls_ladder.load_stats()
+    assert dls_ladder.STATS[KEY] == {'stat': {'red': [10, 4]},
+                                     'name': {'x2': [1, 1]}}
+    assert len(dls_ladder.ladder(KEY, 'stat')) == 3
+
+
+def test_worker_stats_are_merged_and_saved():
+    record('red', 4, 3)
+    new = dls_ladder.take()
+    assert dls_ladder.take() == {}
+    dls_ladder.merge(new)
+    dls_ladder.save_stats()
+    dls_ladder.load_stats()
+    assert dls_ladder.STATS[KEY]['stat']['red'] == [8, 6]
@@ -0,0 +1,97 @@
+from PIL import Image
+import pytest
+
+import dls_dedup
+import dls_digits
+import dls_player_data
+import dls_synth
+
+# (DEVICE key, seed, jitter, grid), scan_coords takes seconds on each
+SCREENSHOTS = [(size, seed, jitter, grid)
+               for size in dls_player_data.DEVICE
+               for seed, jitter, grid in ((0, 0, None), (1, 2, None),
+                                          (2, 1, (2, 3)))]
+
+
+@pytest.mark.parametrize('size, seed, jitter, grid', SCREENSHOTS)
+def test_scan_coords_fast_matches_scan_coords(size, seed, jitter, grid):
+    image = dls_synth.render(size, seed, jitter=jitter, grid=grid)[0]
+    device_dict = dls_player_data.scan_coords(image)
+    assert device_dict
+    assert dls_player_data.scan_coords_fast(image) == device_dict
+
+
+def test_scan_coords_fast_matches_without_cards():
+    image = Image.new('RGB', (1792, 828), dls_synth.BACKGROUND)
+    assert dls_player_data.scan_coords(image) == {}
+    assert dls_player_data.scan_coords_fast(image) == {}
+
+
+@pytest.mark.parametrize('size', list(dls_player_data.DEVICE))
+@pytest.mark.parametrize('fraction', [0.25, 0.3, 0.4])
+def test_screen_cut_short_has_no_layout(size, fraction):
+    image = dls_synth.render(size, 3, secret=0)[0]
+    image = image.crop((0, 0, image.width, int(image.height * fraction)))
+    assert dls_player_data.scan_coords_fast(image) == {}
+
+
+def test_screenshot_without_layout_has_no_cards(monkeypatch):
+    image = dls_synth.render('828x1792', 3, secret=0)[0]
+    image.crop((0, 0, image.width, image.height // 4)).save('cut.png')
+    assert dls_player_data.screenshot_cards('cut.png') == []
+
+    def broken(image):
+        raise KeyError('stats_size')
+
+    monkeypatch.setattr(dls_player_data, 'get_layout', broken)
+    image.save('full.png')
+    assert dls_player_data.screenshot_cards('full.png') == []
+
+
+def test_worker_reuses_the_dedup_layout(monkeypatch):
+    dls_synth.render('828x1792', 3, secret=0)[0].save('shot.png')
+    calls = []
+    get_layout = dls_player_data.get_layout
+
+    def counted(image):
+        calls.append(image.size)
+        return get_layout(image)
+
+    monkeypatch.setattr(dls_player_data, 'get_layout', counted)
+    dls_dedup.load_hashes()
+    indexes, device_dict = dls_player_data.new_cards('shot.png')
+    assert len(indexes) == len(dls_player_data.card_boxes(device_dict))
+    # No card left to read, the worker could only find the layout again
+    cards, players = dls_player_data.parse_file('shot.png', {}, [],
+                                                device_dict)[:2]
+    assert (cards, players) == (len(indexes), [])
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize('size', list(dls_player_data.DEVICE))
+@pytest.mark.parametrize('grid', [(3, 3), (2, 3), (3, 2), (1, 3), (2, 1),
+                                  (1, 1)])
+def test_grid_is_detected(size, grid):
+    dls_synth.render(size, 4, grid=grid, secret=0)[0].save('shot.png')
+    cards = dls_player_data.screenshot_cards('shot.png')
+    assert len(cards) == grid[0] * grid[1]
+    assert all(card.size == dls_player_data.CARD_SIZE
+               for card, layout, box in cards)
+
+
+def test_card_layout_is_canonical():
+    for device_dict in dls_player_data.DEVICE.values():
+        layout = dls_player_data.card_layout(device_dict)
+        assert (layout['card_width'], layout['card_height']) == \
+            dls_player_data.CARD_SIZE
+        assert dls_player_data.card_layout(layout) is layout
+
+
+def test_layout_keys_stay_per_device():
+    # Resampled cards all have CARD_SIZE, digits and ladders are still
+    # learned per source layout
+    keys = {dls_digits.layout_key(dls_player_data.card_layout(x))
+            for x in dls_player_data.DEVICE.values()}
+    assert keys == {f'{x["card_width"]}x{x["card_height"]}'
+                    for x in dls_player_data.DEVICE.values()}
+    assert len(keys) == len(dls_player_data.DEVICE)
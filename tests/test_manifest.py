@@ -0,0 +1,85 @@
+import dls_manifest
+import dls_player_data
+
+
+def test_checkpoint_round_trip(screenshot, values):
+    filename, device_dict = screenshot('shots')
+    key = dls_manifest.file_key(filename)
+    assert dls_manifest.file_stage(key) is None
+
+    box = dls_player_data.card_boxes(device_dict)[0]
+    layout = dls_player_data.card_layout(device_dict)
+    dls_manifest.checkpoint(key, filename, [(0, box, layout, values),
+                                            (1, box, layout, values)])
+    assert dls_manifest.file_stage(key) == 'parsed'
+    assert dls_manifest.parsed_players(key) == [(0, box, layout, values),
+                                                (1, box, layout, values)]
+
+
+def test_review_stages(screenshot, values):
+    filename, device_dict = screenshot('shots')
+    key = dls_manifest.file_key(filename)
+    box = dls_player_data.card_boxes(device_dict)[0]
+    dls_manifest.checkpoint(key, filename, [(0, box, {}, values),
+                                            (1, box, {}, values)])
+    row = ['Luka Modric', '84', 'CM']
+    dls_manifest.review((key, 0), row)
+    # A file stays parsed until all of its players are reviewed
+    assert dls_manifest.file_stage(key) == 'parsed'
+    assert [x[0] for x in dls_manifest.parsed_players(key)] == [1]
+
+    dls_manifest.review((key, 1))
+    assert dls_manifest.file_stage(key) == 'reviewed'
+    assert dls_manifest.reviewed_players() == [((key, 0), row)]
+
+    dls_manifest.written([(key, 0)])
+    assert dls_manifest.file_stage(key) == 'written'
+    assert dls_manifest.reviewed_players() == []
+
+
+def test_parsed_screenshot_is_resumed_without_ocr(screenshot, values,
+                                                  monkeypatch):
+    filename, device_dict = screenshot('shots')
+    key = dls_manifest.file_key(filename)
+    boxes = dls_player_data.card_boxes(device_dict)
+    dls_manifest.checkpoint(key, filename, [(3, boxes[3], device_dict,
+                                             values)])
+
+    def no_reader():
+        raise AssertionError('OCR on a checkpointed screenshot')
+
+    monkeypatch.setattr(dls_player_data, 'get_reader', no_reader)
+    players = dls_player_data.parse_image('shots', output=True,
+                                          metrics=False, adaptive=False)
+    assert len(players) == 1
+    reference, *replayed, source = players[0]
+    assert reference == (filename, boxes[3],
+                         dls_player_data.card_layout(device_dict))
+    assert tuple(replayed) == values
+    assert source == (key, 3)
+
+
+def test_screenshot_without_players_is_parsed_again(screenshot, reader,
+                                                    monkeypatch):
+    filename = screenshot('shots')[0]
+    key = dls_manifest.file_key(filename)
+    get_layout = dls_player_data.get_layout
+    calls = []
+
+    def failing(image):
+        calls.append(image)
+        if len(calls) == 1:
+            raise ValueError('no layout')
+
+        return get_layout(image)
+
+    monkeypatch.setattr(dls_player_data, 'get_layout', failing)
+    reader()
+    # The layout error is swallowed, the file has no players
+    assert dls_player_data.parse_image('shots', output=True, dedup=False,
+                                       metrics=False, adaptive=False) == []
+    assert dls_manifest.file_stage(key) == 'empty'
+
+    dls_player_data.parse_image('shots', output=True, dedup=False,
+                                metrics=False, adaptive=False)
+    assert len(calls) == 2
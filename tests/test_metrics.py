@@ -0,0 +1,55 @@
+import json
+
+import dls_metrics
+
+
+def run(stages: dict, counts: dict):
+    dls_metrics.reset()
+    for stage, calls in stages.items():
+        for _ in range(calls):
+            with dls_metrics.timer(stage):
+                pass
+
+    for counter, value in counts.items():
+        dls_metrics.count(counter, value)
+
+    dls_metrics.export()
+
+
+def samples(text: str) -> dict:
+    return {x.rsplit(' ', 1)[0]: float(x.rsplit(' ', 1)[1])
+            for x in text.splitlines() if x and not x.startswith('#')}
+
+
+def test_prometheus_exports_last_run_gauges():
+    run({'ocr': 3}, {'cards': 9})
+    with open(dls_metrics.PROMETHEUS_FILE, encoding='utf-8') as f:
+        text = f.read()
+
+    types = [x.split()[2:] for x in text.splitlines()
+             if x.startswith('# TYPE')]
+    assert all(x[1] == 'gauge' and not x[0].endswith('_total')
+               for x in types)
+    values = samples(text)
+    assert values['dls_last_run_stage_calls{stage="ocr"}'] == 3
+    assert values['dls_last_run_events{event="cards"}'] == 9
+
+    # A later, smaller run replaces the values
+    run({'ocr': 1}, {'cards': 2})
+    with open(dls_metrics.PROMETHEUS_FILE, encoding='utf-8') as f:
+        values = samples(f.read())
+
+    assert values['dls_last_run_stage_calls{stage="ocr"}'] == 1
+    assert values['dls_last_run_events{event="cards"}'] == 2
+
+
+def test_merge_adds_worker_metrics():
+    run({'ocr': 2}, {'cards': 6})
+    worker = dls_metrics.snapshot()
+    dls_metrics.merge(worker)
+    dls_metrics.export()
+    with open(dls_metrics.METRICS_FILE, encoding='utf-8') as f:
+        summary = json.load(f)
+
+    assert summary['stages']['ocr']['calls'] == 4
+    assert summary['counters'] == {'cards': 12}
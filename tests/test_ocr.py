@@ -0,0 +1,136 @@
+import dls_cache
+import dls_metrics
+import dls_player_data
+import dls_synth
+from dls_preprocess import LADDERS, preprocess
+
+
+def answer_card(stub, card, layout: dict, player: dict):
+    '''
+    The stub reads the name, overall, position and stats of the card on
+    their first rung
+    '''
+    stub.add(preprocess(card.crop(layout['name']), LADDERS['name'][0]),
+             player['name'].lower())
+    stub.add(preprocess(card.crop(layout['overall']),
+                        LADDERS['overall'][0]), str(player['overall']))
+    stub.add(preprocess(card.crop(layout['position']),
+                        LADDERS['position'][0]), player['position'])
+    for box, stat in zip(dls_player_data.stat_boxes(layout),
+                         player['stats']):
+        stub.add(preprocess(card.crop(box), 'plain'), str(stat))
+
+
+def parsed(player: dict) -> tuple:
+    return (('', ''), player['name'], player['overall'], player['position'],
+            player['stats'], player['height'], player['leg'],
+            player['price'])
+
+
+def test_panel_without_detector_is_read_by_field(reader, render_card,
+                                                 player):
+    stub = reader(detector=False)
+    card, layout = render_card(player)
+    answer_card(stub, card, layout, player)
+    # The measured boxes read nothing, the panel fields do
+    for box, text in zip(dls_player_data.panel_boxes(layout, False),
+                         (f'{player["height"]}cm',
+                          dls_synth.LEGS[player['leg']],
+                          f'{player["price"]:,}')):
+        stub.add(preprocess(card.crop(box), 'plain'), text)
+
+    # detect=True can't be honoured, the whole panel is never cropped
+    result = dls_player_data.parse_cards([(card, layout)], detect=True,
+                                         digits=False, check=False,
+                                         adaptive=False)
+    assert [(i, x[:8]) for i, x in result] == [(0, parsed(player))]
+    assert all(x[0] == 'recognize' for x in stub.calls)
+
+    name = card.crop(layout['name'])
+    languages = '+'.join(dls_player_data.READER_CONFIG['languages'])
+    keys = [dls_cache.crop_key(name, f'{LADDERS["name"][0]}/{languages}',
+                               None, x) for x in (False, True)]
+    found = dls_cache.get_many(keys)
+    assert keys[0] in found and keys[1] not in found
+
+
+def test_batch_results_are_mapped_back_by_offset(reader, render_card,
+                                                 player):
+    stub = reader(detector=False)
+    card, layout = render_card(player)
+    crops = [card.crop(box) for box in dls_player_data.stat_boxes(layout)]
+    crops += [card.crop(layout['name']), card.crop(layout['overall'])]
+    for i, crop in enumerate(crops[:-1]):
+        stub.add(crop, f'text {i}')
+
+    # One canvas, the last crop reads nothing
+    texts = dls_player_data.read_batch(crops, detect=False)
+    assert stub.calls == [('recognize', None, len(crops))]
+    assert texts == [([f'text {i}'], 0.9) for i in range(len(crops) - 1)] \
+        + [([], 0.0)]
+
+
+def test_second_rung_reads_only_the_empty_tiles(reader, render_card,
+                                                player):
+    stub = reader(detector=False)
+    card, layout = render_card(player)
+    answer_card(stub, card, layout, player)
+    boxes = dls_player_data.stat_boxes(layout)
+    for j in (2, 5):
+        stub.add(preprocess(card.crop(boxes[j]), 'plain'), '')
+        stub.add(preprocess(card.crop(boxes[j]), 'red'),
+                 str(player['stats'][j]))
+
+    for box, text in zip(dls_player_data.panel_boxes(layout),
+                         (f'{player["height"]}cm',
+                          dls_synth.LEGS[player['leg']],
+                          f'{player["price"]:,}')):
+        stub.add(preprocess(card.crop(box), 'plain'), text)
+
+    result = dls_player_data.parse_cards([(card, layout)], digits=False,
+                                         check=False, adaptive=False)
+    assert [(i, x[:8]) for i, x in result] == [(0, parsed(player))]
+    digits = dls_player_data.DIGITS
+    # Name, then the first rung of every field, then the two tiles
+    assert stub.calls == [('recognize', None, 1),
+                          ('recognize', digits, 10),
+                          ('recognize', None, 2),
+                          ('recognize', digits + ',', 1),
+                          ('recognize', digits, 2)]
+
+
+def test_empty_panel_field_is_read_by_the_detector(reader, render_card,
+                                                   player):
+    stub = reader(detector=True)
+    card, layout = render_card(player)
+    answer_card(stub, card, layout, player)
+    height, leg, price = dls_player_data.panel_boxes(layout)
+    stub.add(preprocess(card.crop(height), 'plain'), '199cm')
+    stub.add(preprocess(card.crop(price), 'plain'), '1')
+    stub.add(preprocess(card.crop(layout['panel']), 'plain'),
+             [f'{player["height"]}cm', dls_synth.LEGS[player['leg']],
+              f'{player["price"]:,}'])
+
+    result = dls_player_data.parse_cards([(card, layout)], digits=False,
+                                         check=False, adaptive=False)
+    # The whole panel replaces the three fields
+    assert [(i, x[:8]) for i, x in result] == [(0, parsed(player))]
+    assert result[0][1][-1][-3:] == [0.8] * 3
+    assert stub.calls[-1] == ('readtext_batched', None, 1)
+
+
+def test_rungs_are_counted_by_variant(reader, render_card, player):
+    stub = reader(detector=False)
+    card, layout = render_card(player)
+    answer_card(stub, card, layout, player)
+    box = dls_player_data.stat_boxes(layout)[0]
+    stub.add(preprocess(card.crop(box), 'plain'), '')
+    stub.add(preprocess(card.crop(box), 'red'), str(player['stats'][0]))
+    dls_metrics.reset()
+    dls_player_data.parse_cards([(card, layout)], digits=False,
+                                check=False, adaptive=False)
+    counts = dls_metrics.COUNTS
+    assert (counts['stat_plain_try'], counts['stat_plain_hit']) == (8, 7)
+    assert (counts['stat_red_try'], counts['stat_red_hit']) == (1, 1)
+    assert 'stat_red_large_try' not in counts
+    assert not any('_rung_' in x for x in counts)
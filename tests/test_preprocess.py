@@ -0,0 +1,87 @@
+import random
+
+from PIL import Image
+import numpy
+import pytest
+
+import dls_player_data
+import dls_synth
+from dls_preprocess import bright_mask, bright_variant, mask_image, \
+    red_mask
+
+
+# The per-pixel loops the masks replaced
+def binarize_stat(stat: Image.Image) -> Image.Image:
+    stat = stat.copy()
+    pixels = stat.load()
+    width, height = stat.size
+    for y in range(height):
+        for x in range(width):
+            if pixels[x, y][0] >= 150 and \
+                    sum(pixels[x, y][1:3]) <= 100:
+                pixels[x, y] = (255, 255, 255)
+            else:
+                pixels[x, y] = (0, 0, 0)
+
+    return stat
+
+
+def binarize_overall(overall_image: Image.Image) -> Image.Image:
+    overall_image = overall_image.copy()
+    pixels = overall_image.load()
+    width, height = overall_image.size
+    for y in range(height):
+        for x in range(width):
+            if sum(pixels[x, y][0:3]) >= 600:
+                pixels[x, y] = (0, 0, 0)
+            else:
+                pixels[x, y] = (255, 255, 255)
+
+    return overall_image
+
+
+def noise(seed: int) -> Image.Image:
+    '''
+    Pixels around the thresholds: red near 150, green + blue near 100
+    and channel sums near 600
+    '''
+    rng = numpy.random.default_rng(seed)
+    array = numpy.concatenate([
+        rng.integers(140, 160, (8, 16, 1)), rng.integers(40, 61, (8, 16, 2)),
+    ], axis=2)
+    array = numpy.concatenate([array, rng.integers(190, 211, (8, 16, 3))])
+    return Image.fromarray(array.astype(numpy.uint8), 'RGB')
+
+
+def crops(size: str, seed: int) -> list[tuple[Image.Image, Image.Image]]:
+    '''
+    Output: (stat tile, overall badge) crops of a synthetic card
+    '''
+    device_dict = dls_player_data.DEVICE[size]
+    image, _, _ = dls_synth.render(size, seed, secret=0)
+    box = dls_player_data.card_boxes(device_dict)[0]
+    card = image.crop(box)
+    return [(card.crop(x), card.crop(device_dict['overall']))
+            for x in dls_player_data.stat_boxes(device_dict)]
+
+
+@pytest.mark.parametrize('size, seed', [('828x1792', 0), ('1536x2048', 1),
+                                        ('828x1792', 2)])
+def test_masks_match_the_pixel_loops(size, seed):
+    for stat, overall in crops(size, seed) + [(noise(seed), noise(seed))]:
+        assert mask_image(red_mask(stat)).tobytes() == \
+            binarize_stat(stat).convert('L').tobytes()
+        assert mask_image(~bright_mask(overall)).tobytes() == \
+            binarize_overall(overall).convert('L').tobytes()
+
+
+def test_bright_variant_matches_the_upscaled_loop():
+    # The old order: 6x NEAREST first, then the threshold
+    badges = [random.Random(x).choice(crops('828x1792', x))[1]
+              for x in range(3)]
+    for overall in badges + [noise(3)]:
+        expected = binarize_overall(overall.resize(
+            (overall.size[0] * 6, overall.size[1] * 6),
+            resample=Image.NEAREST))
+        assert bright_variant(overall).tobytes() == \
+            expected.convert('L').tobytes()
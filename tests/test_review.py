@@ -0,0 +1,114 @@
+import os
+
+import pytest
+
+import dls_manifest
+import dls_player_data
+
+
+@pytest.fixture
+def players(checkpointed) -> list[tuple]:
+    '''
+    Player tuples of a checkpointed screenshot, replayed without OCR
+    '''
+    return dls_player_data.parse_image(checkpointed('shots', (5,)),
+                                       output=True, dedup=False,
+                                       metrics=False, adaptive=False)
+
+
+def flat(images: tuple) -> list:
+    return [x for a in images for x in (a if isinstance(a, list) else [a])]
+
+
+def test_player_tuples_keep_no_images(players):
+    for player in players:
+        filename, box, layout = player[0]
+        assert isinstance(filename, str)
+        assert not any(hasattr(x, 'tobytes') for x in flat(player))
+
+
+def test_player_images_are_the_card_crops(players):
+    cards = dls_player_data.screenshot_cards(os.path.join('shots', '5.png'))
+    assert len(players) == len(cards)
+    for player, (card, layout, box) in zip(players, cards):
+        images = dls_player_data.player_images(player)
+        expected = dls_player_data.card_images(card, layout)
+        assert [x.tobytes() for x in flat(images)] == \
+            [x.tobytes() for x in flat(expected)]
+
+        crops, values = dls_player_data.review_fields(player, images)
+        assert len(crops) == len(values) == dls_player_data.REVIEW_FIELDS
+
+
+def test_rewritten_screenshot_is_decoded_again(screenshot):
+    filename = screenshot('shots', 0)[0]
+    before = dls_player_data.screenshot(filename).tobytes()
+    screenshot('shots', 1)
+    os.replace(os.path.join('shots', '1.png'), filename)
+    os.utime(filename, ns=(0, os.stat(filename).st_mtime_ns + 10 ** 9))
+    assert dls_player_data.screenshot(filename).tobytes() != before
+
+
+class Root:
+    '''
+    Tk stand-in running the scheduled callbacks, every shown player is
+    skipped (Escape)
+    '''
+    def __init__(self):
+        self.calls = []
+        self.bindings = {}
+        self.running = False
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: ''
+
+    def after(self, ms, callback):
+        self.calls.append(callback)
+
+    def bind(self, sequence, callback):
+        self.bindings[sequence] = callback
+
+    def quit(self):
+        self.running = False
+
+    def mainloop(self):
+        self.running = True
+        while self.running and self.calls:
+            try:
+                self.calls.pop(0)()
+            except Exception as e:
+                # Tk reports the errors of callbacks and goes on
+                print(repr(e))
+
+            self.bindings['<Escape>']()
+
+
+def test_unreadable_screenshot_is_skipped(players, checkpointed,
+                                          monkeypatch):
+    root = Root()
+    monkeypatch.setattr(dls_player_data, 'Tk', lambda: root)
+    for name in ('Label', 'Entry', 'Button'):
+        monkeypatch.setattr(dls_player_data, name, lambda *a, **k: Root())
+
+    broken = []
+
+    def photo(image):
+        if not broken:
+            broken.append(image)
+            raise OSError('broken image')
+
+        return image
+
+    monkeypatch.setattr(dls_player_data.ImageTk, 'PhotoImage', photo)
+    others = dls_player_data.parse_image(checkpointed('more', (6,)),
+                                         output=True, dedup=False,
+                                         metrics=False, adaptive=False)
+    os.remove(os.path.join('more', '6.png'))
+    dls_player_data.check_gui(players + others, triage=False)
+    key = players[0][11][0]
+    assert dls_manifest.file_stage(key) == 'parsed'
+    assert [x[0] for x in dls_manifest.parsed_players(key)] == \
+        [players[0][11][1]]
+    assert dls_manifest.file_stage(others[0][11][0]) == 'parsed'
+    assert len(dls_manifest.parsed_players(others[0][11][0])) == \
+        len(others)
@@ -0,0 +1,35 @@
+import os
+
+import dls_ladder
+import dls_player_data
+
+
+class Widget:
+    '''
+    Tk stand-in, the window is closed as soon as it opens
+    '''
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: ''
+
+
+def test_closed_iteration_saves_ladders(checkpointed):
+    players = dls_player_data.iter_players(checkpointed('shots', range(3)),
+                                           queue_size=1, output=True,
+                                           dedup=False)
+    next(players)
+    players.close()
+    assert os.path.exists(dls_ladder.LADDER_FILE)
+
+
+def test_closed_window_stops_fetching(checkpointed, monkeypatch):
+    for name in ('Tk', 'Label', 'Entry', 'Button'):
+        monkeypatch.setattr(dls_player_data, name, Widget)
+
+    players = dls_player_data.iter_players(checkpointed('shots', range(3)),
+                                           queue_size=1, output=True,
+                                           dedup=False)
+    dls_player_data.check_gui(players, triage=False)
+    assert os.path.exists(dls_ladder.LADDER_FILE)
@@ -0,0 +1,24 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Seconds the import may take (about 0.2 s, the models load on first use)
+IMPORT_SECONDS = 1.0
+HEAVY = ('easyocr', 'torch', 'openpyxl', 'cv2', 'tqdm')
+
+
+def test_import_is_light():
+    code = 'from time import perf_counter; import json, sys; ' \
+        't = perf_counter(); import dls_player_data; ' \
+        't = perf_counter() - t; ' \
+        f'print(json.dumps([t, [x for x in {HEAVY!r} ' \
+        'if x in sys.modules]]))'
+    seconds, loaded = min(
+        (json.loads(subprocess.run([sys.executable, '-c', code],
+                                   capture_output=True, text=True,
+                                   check=True, cwd=ROOT).stdout)
+         for _ in range(3)), key=lambda x: x[0])
+    assert loaded == []
+    assert seconds < IMPORT_SECONDS
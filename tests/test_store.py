@@ -0,0 +1,49 @@
+import dls_store
+
+COLUMNS = len(dls_store.COLUMNS)
+
+
+def values(first: str, last: str, rating: int) -> list:
+    row = [None] * COLUMNS
+    row[:9] = [first, last, 1000, 'England', 'Spurs', 'CF', 'R', rating,
+               188]
+    return row
+
+
+def test_find_is_case_and_space_insensitive():
+    dls_store.save(None, 'Rare Players', values('Harry', 'Kane', 79))
+    player = dls_store.find('  harry   KANE ')
+    assert (player['first_name'], player['rating']) == ('Harry', 79)
+    assert dls_store.find('Harry Maguire') is None
+    assert dls_store.names() == ['Harry Kane']
+
+
+def test_moved_player_goes_to_the_end_of_its_sheet():
+    dls_store.save(None, 'Legendary Players', values('Luis', 'Suarez', 84))
+    dls_store.save(None, 'Rare Players', values('Harry', 'Kane', 79))
+    dls_store.save(dls_store.find('Harry Kane'), 'Legendary Players',
+                   values('Harry', 'Kane', 86))
+    assert [(x[1][1], x[1][7]) for x in
+            dls_store.sheet_rows('Legendary Players')] == [('Suarez', 84),
+                                                           ('Kane', 86)]
+    assert dls_store.sheet_rows('Rare Players') == []
+    assert [x[0] for x in dls_store.rating_history('Harry Kane')] == [79,
+                                                                      86]
+
+
+def test_update_keeps_the_row():
+    for name in ('Luis', 'Ivan'):
+        dls_store.save(None, 'Rare Players', values(name, 'X', 70))
+
+    dls_store.save(dls_store.find('Luis X'), 'Rare Players',
+                   values('Luis', 'X', 75))
+    assert [(x[1][0], x[1][7]) for x in
+            dls_store.sheet_rows('Rare Players')] == [('Luis', 75),
+                                                      ('Ivan', 70)]
+
+
+def test_clear_updated():
+    dls_store.save(None, 'Rare Players', values('Harry', 'Kane', 79))
+    assert dls_store.find('Harry Kane')['updated'] == 1
+    dls_store.clear_updated()
+    assert dls_store.find('Harry Kane')['updated'] == 0
@@ -0,0 +1,38 @@
+import dls_triage
+
+# name, overall, position, 8 stats, height, leg, price
+GOOD = ['Harry Kane', '87', 'CF', *['80'] * 8, '188', 'R', '3200']
+CONFIDENT = [0.99] * 14
+
+
+def test_confident_plausible_card_has_no_doubtful_field():
+    assert dls_triage.doubtful_fields(GOOD, CONFIDENT) == []
+
+
+def test_doubtful_fields():
+    assert dls_triage.doubtful_fields(GOOD, [0.99, 0.4, *[0.99] * 12]) == \
+        [1]
+    values = ['', '87', 'XX', *['80'] * 7, '8', '88', 'Q', '3200']
+    assert dls_triage.doubtful_fields(values, CONFIDENT) == [0, 2, 10, 11,
+                                                             12]
+
+
+def test_price_is_checked_against_the_rating():
+    assert dls_triage.doubtful_fields(GOOD[:13] + ['320'], CONFIDENT) == \
+        [13]
+    # No reference prices below PRICE_BASE
+    low = ['Test Newman', '65', 'CM', *['60'] * 8, '180', 'L', '90']
+    assert dls_triage.doubtful_fields(low, CONFIDENT) == []
+    # A misread overall isn't used for the price check
+    assert dls_triage.doubtful_fields(['Harry Kane', '8', *GOOD[2:]],
+                                      CONFIDENT) == [1]
+
+
+def test_worst_first():
+    cards = [(GOOD, CONFIDENT),
+             (GOOD, [0.99, 0.5, *[0.99] * 12]),
+             (['', *GOOD[1:]], [0.2, 0.6, *[0.99] * 12]),
+             (GOOD, [0.99, 0.8, *[0.99] * 12])]
+    order = sorted(range(len(cards)),
+                   key=lambda x: dls_triage.review_order(*cards[x]))
+    assert order == [2, 1, 3, 0]
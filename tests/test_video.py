@@ -0,0 +1,49 @@
+import os
+
+from PIL import Image
+
+import dls_synth
+import dls_video
+
+
+def scrolled(a: Image.Image, b: Image.Image, fraction: float) -> Image.Image:
+    '''
+    Frame of a scroll from page a to page b
+    '''
+    shift = int(a.height * fraction)
+    frame = Image.new('RGB', a.size)
+    frame.paste(a.crop((0, shift, a.width, a.height)), (0, 0))
+    frame.paste(b.crop((0, 0, b.width, shift)), (0, a.height - shift))
+    return frame
+
+
+def recording() -> list[Image.Image]:
+    '''
+    Page a, a scroll with a short stop half way, page b, a small scroll
+    and back to b (30 frames per second)
+    '''
+    a, b = (dls_synth.render('828x1792', x, secret=0)[0] for x in (1, 2))
+    return [a] * 15 + [scrolled(a, b, x / 6) for x in range(1, 3)] + \
+        [scrolled(a, b, 0.5)] * 4 + \
+        [scrolled(a, b, x / 6) for x in range(4, 6)] + [b] * 15 + \
+        [scrolled(b, a, 0.02)] * 3 + [b] * 12
+
+
+def test_keyframes_of_a_frame_folder():
+    os.mkdir('frames')
+    for index, frame in enumerate(recording()):
+        frame.save(os.path.join('frames', f'{index:04d}.png'))
+
+    assert [x[0] for x in dls_video.keyframes('frames')] == [0, 23]
+    assert dls_video.extract('frames', 'kept') == [
+        os.path.join('kept', 'frame_000000.png'),
+        os.path.join('kept', 'frame_000023.png')]
+
+
+def test_keyframes_of_an_animated_png():
+    frames = recording()
+    frames[0].save('recording.png', save_all=True,
+                   append_images=frames[1:], duration=1000 / 30)
+    kept = list(dls_video.keyframes('recording.png'))
+    assert len(kept) == 2
+    assert kept[1][1].tobytes() == frames[23].tobytes()
@@ -0,0 +1,76 @@
+import io
+import os
+from threading import Event, Thread
+from time import sleep
+
+import dls_synth
+import dls_watch
+
+
+def png() -> bytes:
+    data = io.BytesIO()
+    dls_synth.render('828x1792', 0, secret=0)[0].save(data, 'PNG')
+    return data.getvalue()
+
+
+def collect(image_dir: str, stop: Event, **kwargs) -> tuple[list, Thread]:
+    found = []
+
+    def run():
+        for filename in dls_watch.watch(image_dir, stop=stop, poll=0.05,
+                                        stable=0.2, **kwargs):
+            found.append(os.path.basename(filename))
+
+    thread = Thread(target=run)
+    thread.start()
+    # The first scan sees the files already there
+    sleep(0.1)
+    return found, thread
+
+
+def test_files_are_yielded_once_fully_written(work_dir):
+    os.mkdir('drop')
+    with open(os.path.join('drop', 'a.png'), 'wb') as f:
+        f.write(png())
+
+    stop = Event()
+    found, thread = collect('drop', stop)
+    data = png()
+    with open(os.path.join('drop', 'b.png'), 'wb') as f:
+        # Written in chunks, slower than `stable`
+        for start in range(0, len(data), len(data) // 3 + 1):
+            f.write(data[start:start + len(data) // 3 + 1])
+            f.flush()
+            assert 'b.png' not in found
+            sleep(0.3)
+
+    # Cut short for good: never decodes
+    with open(os.path.join('drop', 'c.png'), 'wb') as f:
+        f.write(data[:len(data) // 2])
+
+    # Hidden and _OLD files are left alone
+    for name in ('.d.png', 'e_OLD.png'):
+        with open(os.path.join('drop', name), 'wb') as f:
+            f.write(data)
+
+    sleep(0.6)
+    stop.set()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert found == ['a.png', 'b.png']
+
+
+def test_existing_files_can_be_skipped(work_dir):
+    os.mkdir('drop')
+    with open(os.path.join('drop', 'a.png'), 'wb') as f:
+        f.write(png())
+
+    stop = Event()
+    found, thread = collect('drop', stop, existing=False)
+    with open(os.path.join('drop', 'b.png'), 'wb') as f:
+        f.write(png())
+
+    sleep(0.6)
+    stop.set()
+    thread.join(5)
+    assert found == ['b.png']
@@ -0,0 +1,167 @@
+import os
+import shutil
+
+from openpyxl import load_workbook
+from openpyxl.formula.translate import Translator
+import pytest
+
+import dls_player_data
+import dls_store
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'DLS 25 test database.xlsx')
+SHEETS = dls_player_data.SHEETS
+# Submitted check_gui rows: same sheet (Legendary, Rare), Rare ->
+# Legendary, Common -> Rare and a new Common player
+DATA = [
+    ['Harry Kane', '87', 'CF', '77', '74', '88', '91', '85', '87', '95',
+     '52', '188', 'R', '3071', '', ''],
+    ['Wissam Ben Yedder', '78', 'CF', '78', '84', '78', '65', '82', '76',
+     '87', '39', '170', 'B', '1566', '', ''],
+    ['Luis Suarez', '81', 'CF', '70', '70', '76', '79', '83', '79', '88',
+     '50', '182', 'R', '2047', '', ''],
+    ['Ivan Balliu', '72', 'RB', '75', '77', '78', '60', '63', '69', '47',
+     '71', '172', 'R', '763', '', ''],
+    ['Test Newman', '65', 'CB', '60', '61', '70', '71', '50', '52', '40',
+     '66', '190', 'L', '390', '', ''],
+]
+
+
+def rows(ws) -> list[tuple]:
+    '''
+    Output: (row, values B:W) of the player rows, '' read as None
+    '''
+    result = []
+    for row, cells in enumerate(ws.iter_rows(min_row=4, max_col=23),
+                                start=4):
+        values = [None if x.value == '' else x.value for x in cells[1:]]
+        if values[:2] != [None, None]:
+            result.append((row, values))
+
+    return result
+
+
+def expected_sheets(workbook, translate: bool = True) -> dict[str, list]:
+    '''
+    The sheets after DATA, built row by row from the template: updated
+    in place, moved players removed and appended to their new sheet.
+    translate=True moves the formulas of the rows that move up with them
+    (dls_store keeps them as text, its export doesn't)
+    '''
+    sheets = {x: rows(workbook[x]) for x in SHEETS}
+    for data_list in DATA:
+        key = dls_store.player_key(None, data_list[0])
+        # The first one in sheet order, like check_has_player
+        old = next(((x, i, y) for x in SHEETS
+                    for i, (_, y) in enumerate(sheets[x])
+                    if dls_store.player_key(*y[:2]) == key), None)
+
+        if old is None:
+            sheet, values = dls_player_data.player_row(data_list)
+        else:
+            before = old[2]
+            sheet, values = dls_player_data.player_row(
+                data_list, int(before[7]), before[3], before[4],
+                before[21])
+
+        values = [None if x == '' else x for x in values[1:]]
+        if old is not None and old[0] == sheet:
+            sheets[sheet][old[1]] = (None, values)
+        else:
+            if old is not None:
+                del sheets[old[0]][old[1]]
+
+            sheets[sheet].append((None, values))
+
+    for sheet, players in sheets.items():
+        for index, (row, values) in enumerate(players):
+            for i, value in enumerate(values):
+                if translate is True and row is not None and \
+                        isinstance(value, str) and value.startswith('='):
+                    values[i] = Translator(value, f'A{row}') \
+                        .translate_formula(f'A{index + 4}')
+
+        sheets[sheet] = [x for _, x in players]
+
+    return sheets
+
+
+def check_sheets(workbook, expected: dict[str, list]):
+    for sheet in SHEETS:
+        written = rows(workbook[sheet])
+        # No gaps left by the removed rows
+        assert [x for x, _ in written] == \
+            list(range(4, 4 + len(written)))
+        for row, values in written:
+            assert values[20] == f'=SUM(K{row}:T{row})'
+
+        assert [x[:20] + x[21:] for _, x in written] == \
+            [x[:20] + x[21:] for x in expected[sheet]]
+
+
+@pytest.fixture
+def workbook(work_dir, monkeypatch):
+    filename = str(work_dir / 'database.xlsx')
+    shutil.copy(TEMPLATE, filename)
+    wb = load_workbook(filename)
+    monkeypatch.setattr(dls_player_data, 'wb', wb)
+    monkeypatch.setattr(dls_player_data, 'empty_database', filename,
+                        raising=False)
+    return filename
+
+
+def test_write_player_data_matches_rebuild(workbook):
+    expected = expected_sheets(load_workbook(TEMPLATE))
+    dls_player_data.write_player_data(DATA)
+    index = {x: [list(y) for y in z]
+             for x, z in dls_player_data.PLAYER_INDEX.items()}
+
+    written = load_workbook(workbook)
+    check_sheets(written, expected)
+    # The index kept up to date by the writes is the one a rebuild reads
+    dls_player_data.index_players(written)
+    assert dls_player_data.PLAYER_INDEX == index
+    for data_list in DATA:
+        assert dls_player_data.check_has_player(data_list[0])[1] is True
+
+
+def test_export_workbook_matches_template(work_dir, monkeypatch):
+    expected = expected_sheets(load_workbook(TEMPLATE), translate=False)
+    monkeypatch.setattr(dls_player_data, 'wb', None)
+    dls_store.import_workbook(TEMPLATE)
+    dls_player_data.store_player_data(DATA)
+    dls_player_data.export_workbook('export.xlsx', TEMPLATE)
+    check_sheets(load_workbook('export.xlsx'), expected)
+
+
+def test_export_edits_are_read_back(work_dir, monkeypatch):
+    monkeypatch.setattr(dls_player_data, 'wb', None)
+    dls_store.import_workbook(TEMPLATE)
+    dls_player_data.store_player_data(DATA)
+    dls_player_data.export_workbook('export.xlsx', TEMPLATE)
+
+    # Hand edits: nationality, rating and the updated flag of Harry Kane
+    exported = load_workbook('export.xlsx')
+    ws = exported['Legendary Players']
+    row = next(x for x in range(4, ws.max_row + 1)
+               if (ws.cell(x, 2).value, ws.cell(x, 3).value) ==
+               ('Harry', 'Kane'))
+    ws.cell(row, 5).value = 'Edited'
+    ws.cell(row, 9).value = 90
+    ws.cell(row, 1).style = 'Normal'
+    exported.save('export.xlsx')
+    # Written after the export, so only in the store
+    dls_player_data.store_player_data([['Late Newman', *DATA[4][1:]]])
+
+    for _ in range(2):
+        dls_player_data.sync_store('export.xlsx', TEMPLATE)
+
+    kane = dls_store.find('Harry Kane')
+    assert (kane['nationality'], kane['updated']) == ('Edited', 0)
+    assert [str(x[0]) for x in dls_store.rating_history('Harry Kane')] == \
+        ['86', '87', '90']
+    late = dls_store.find('Late Newman')
+    assert late['updated'] == 1
+    assert late['row'] == max(x['row'] for x in dls_store.connect().execute(
+        'SELECT row FROM players WHERE sheet = ?', (late['sheet'],)))
+    assert dls_store.find('Ivan Balliu')['updated'] == 1